@@ -1,10 +1,26 @@
 from flask import (
-    Flask, render_template, request, redirect, url_for, session, flash, g
+    Flask, render_template, stream_template, request, redirect, url_for, session, flash, g, jsonify, has_request_context
 )
 import sqlite3
 import os
+import threading
+import logging
+import heapq
+import time
+import click
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta, date
+from urllib.parse import quote
+from db import ConnectionPool, RowStream
+import queries as Q
+from schema import check_query_plans, to_ts, now_ts
+from migrations import MIGRATIONS, migrate, status as migration_status
+import counters
+import compaction
+import archive
+import backup
+from cache import DoctorDirectory
+from search import search_doctor_ids, patient_page
 
 # Project Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -12,84 +28,287 @@ DB_PATH = os.path.join(BASE_DIR, "hospital.db")
 
 app = Flask(__name__)
 app.secret_key = "change_this_to_a_random_secret_key" 
+app.config.from_mapping(
+    DATABASE=DB_PATH,
+    DB_POOL_SIZE=int(os.environ.get("HOSPITAL_DB_POOL_SIZE", "8")),
+    DB_POOL_TIMEOUT=float(os.environ.get("HOSPITAL_DB_POOL_TIMEOUT", "10")),
+    DB_PROFILE=os.environ.get("HOSPITAL_DB_PROFILE", "balanced"),
+    SLOW_QUERY_MS=float(os.environ.get("HOSPITAL_SLOW_QUERY_MS", "100")),
+    SLOW_QUERY_LOG=os.environ.get("HOSPITAL_SLOW_QUERY_LOG", os.path.join(BASE_DIR, "slow_queries.log")),
+    SEARCH_PAGE_SIZE=int(os.environ.get("HOSPITAL_SEARCH_PAGE_SIZE", "20")),
+    PATIENT_PAGE_SIZE=int(os.environ.get("HOSPITAL_PATIENT_PAGE_SIZE", "50")),
+    APPOINTMENT_PAGE_SIZE=int(os.environ.get("HOSPITAL_APPOINTMENT_PAGE_SIZE", "50")),
+    AVAILABILITY_DAYS=int(os.environ.get("HOSPITAL_AVAILABILITY_DAYS", "7")),
+    EARLIEST_SLOTS=int(os.environ.get("HOSPITAL_EARLIEST_SLOTS", "10")),
+    SLOT_WINDOW_DAYS=int(os.environ.get("HOSPITAL_SLOT_WINDOW_DAYS", "14")),
+    COMPACTION_INTERVAL=float(os.environ.get("HOSPITAL_COMPACTION_INTERVAL", "0")),
+    COMPACTION_BATCH=int(os.environ.get("HOSPITAL_COMPACTION_BATCH", "500")),
+    COMPACTION_PAUSE=float(os.environ.get("HOSPITAL_COMPACTION_PAUSE", "0.05")),
+    ARCHIVE_DATABASE=os.environ.get("HOSPITAL_ARCHIVE_DATABASE", os.path.join(BASE_DIR, "hospital_archive.db")),
+    ARCHIVE_AFTER_DAYS=int(os.environ.get("HOSPITAL_ARCHIVE_AFTER_DAYS", "730")),
+    ARCHIVE_BATCH=int(os.environ.get("HOSPITAL_ARCHIVE_BATCH", "500")),
+    BACKUP_DIR=os.environ.get("HOSPITAL_BACKUP_DIR", os.path.join(BASE_DIR, "backups")),
+    BACKUP_KEEP=int(os.environ.get("HOSPITAL_BACKUP_KEEP", "7")),
+    BACKUP_PAGES=int(os.environ.get("HOSPITAL_BACKUP_PAGES", "256")),
+    BACKUP_SLEEP=float(os.environ.get("HOSPITAL_BACKUP_SLEEP", "0.01")),
+)
+
+query_logger = logging.getLogger("hospital.queries")
+slow_query_logger = logging.getLogger("hospital.slow_queries")
+compaction_logger = logging.getLogger("hospital.compaction")
+backup_logger = logging.getLogger("hospital.backup")
+if app.config["SLOW_QUERY_LOG"]:
+    _slow_handler = logging.FileHandler(app.config["SLOW_QUERY_LOG"], delay=True)
+    _slow_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_query_logger.addHandler(_slow_handler)
+    slow_query_logger.setLevel(logging.WARNING)
 
 # --- Database Connection ---
-def get_db():
-    """Connects to the database."""
-    if "db" not in g:
-        g.db = sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES)
-        g.db.row_factory = sqlite3.Row
-    return g.db
+_pool_lock = threading.Lock()
+
+def get_pool(readonly=False):
+    """Returns the reader or writer pool, creating both on first use.
+
+    The writer pool holds a single connection, so mutations within a process
+    are serialized; readers get DB_POOL_SIZE read-only connections.
+    """
+    with _pool_lock:
+        pools = app.extensions.get("db_pools")
+        if pools is None:
+            cfg = app.config
+            writer = ConnectionPool(cfg["DATABASE"], size=1, warm=1,
+                                    timeout=cfg["DB_POOL_TIMEOUT"], profile=cfg["DB_PROFILE"])
+            conn = writer.acquire()
+            try:
+                migrate(conn)
+            finally:
+                writer.release(conn)
+            reader = ConnectionPool(cfg["DATABASE"], size=cfg["DB_POOL_SIZE"], timeout=cfg["DB_POOL_TIMEOUT"],
+                                    profile=cfg["DB_PROFILE"], readonly=True)
+            pools = app.extensions["db_pools"] = {"read": reader, "write": writer}
+            app.extensions["doctor_directory"] = DoctorDirectory()
+            if cfg["COMPACTION_INTERVAL"] > 0 and "compactor" not in app.extensions:
+                app.extensions["compactor"] = threading.Thread(target=compaction_worker, name="slot-compactor", daemon=True)
+                app.extensions["compactor"].start()
+    return pools["read" if readonly else "write"]
+
+def get_db(readonly=None):
+    """Checks a pooled connection out for the current request.
+
+    GET and HEAD requests get a read-only connection unless ``readonly=False``
+    is passed; everything else (and CLI commands) uses the writer.
+    """
+    if readonly is None:
+        readonly = has_request_context() and request.method in ("GET", "HEAD")
+    key = "db_ro" if readonly else "db"
+    if key not in g:
+        conn = get_pool(readonly).acquire()
+        conn.query_log = []
+        setattr(g, key, conn)
+    return g.get(key)
+
+def get_directory():
+    """The doctor directory, served from the per-process cache while its version is current."""
+    get_pool()
+    return app.extensions["doctor_directory"].get(get_db())
+
+def request_connections():
+    return [conn for conn in (g.get("db_ro"), g.get("db")) if conn is not None]
+
+@app.after_request
+def add_query_summary(response):
+    """Reports the request's query count and DB time in a Server-Timing header."""
+    records = [r for conn in request_connections() for r in conn.query_log]
+    if records:
+        total_ms = sum(r.duration for r in records) * 1000
+        response.headers["Server-Timing"] = f'db;dur={total_ms:.2f};desc="{len(records)} queries"'
+    return response
+
+@app.teardown_request
+def log_queries(exc):
+    """Logs a per-request query summary and sends slow statements, with their plans, to the slow-query log."""
+    threshold = app.config["SLOW_QUERY_MS"] / 1000
+    count = total = rows = 0
+    for conn in request_connections():
+        for r in conn.query_log:
+            count, total, rows = count + 1, total + r.duration, rows + r.rows
+            if r.duration >= threshold:
+                plan = " | ".join(conn.explain(r))
+                slow_query_logger.warning("%.1f ms %s %s %s rows=%d %s plan=[%s]", r.duration * 1000, request.method,
+                                          request.path, r.name, r.rows, r.shape, plan)
+    if count:
+        query_logger.info("%s %s: %d queries, %.2f ms, %d rows", request.method, request.path, count, total * 1000, rows)
 
 @app.teardown_appcontext
 def close_db(exc):
-    """Closes the connection when the request ends."""
-    db = g.pop("db", None)
-    if db is not None:
-        db.close()
+    """Returns the request's connections to their pools when the request ends."""
+    for key, readonly in (("db_ro", True), ("db", False)):
+        db = g.pop(key, None)
+        if db is not None:
+            db.query_log = None
+            get_pool(readonly).release(db)
+
+def compact_slots(db):
+    """Runs one compaction of open slots from before today and records its report for /admin/db/stats."""
+    cfg = app.config
+    report = compaction.compact(db, to_ts(date.today().isoformat(), "00:00"),
+                                batch=cfg["COMPACTION_BATCH"], pause=cfg["COMPACTION_PAUSE"])
+    app.extensions["last_compaction"] = dict(report._asdict(), finished_at=datetime.now().isoformat(timespec="seconds"))
+    compaction_logger.info("compacted %d expired slots in %d batches, %d -> %d pages (%d free), %.1f s", report.rows,
+                           report.batches, report.pages_before, report.pages_after, report.free_pages, report.seconds)
+    if not report.vacuumed and report.free_pages:
+        compaction_logger.warning("vacuum skipped: auto_vacuum is not INCREMENTAL, so %d free pages stay in the file;"
+                                  " run flask compact-slots --enable-incremental-vacuum once to reclaim them", report.free_pages)
+    return report
+
+def compaction_worker():
+    """Background loop that compacts every COMPACTION_INTERVAL seconds on its own connection.
+
+    The connection is separate from the writer pool, so requests never wait
+    on the worker for a connection, only on SQLite's lock for one batch. Every
+    worker process starts this loop, but a tick only compacts when it wins the
+    lease in the database, so one process compacts per interval.
+    """
+    cfg = app.config
+    pool = ConnectionPool(cfg["DATABASE"], size=1, warm=0, timeout=cfg["DB_POOL_TIMEOUT"], profile=cfg["DB_PROFILE"])
+    while True:
+        time.sleep(cfg["COMPACTION_INTERVAL"])
+        conn = pool.acquire()
+        try:
+            if compaction.claim(conn, cfg["COMPACTION_INTERVAL"]):
+                compact_slots(conn)
+                compaction.extend(conn, cfg["COMPACTION_INTERVAL"])
+        except sqlite3.Error:
+            compaction_logger.exception("slot compaction failed")
+        finally:
+            pool.release(conn)
+
+def take_backup():
+    """Snapshots the database into BACKUP_DIR, rotates old snapshots and records the result for /admin/db/stats."""
+    cfg = app.config
+    snap = backup.snapshot(cfg["DATABASE"], cfg["BACKUP_DIR"], pages=cfg["BACKUP_PAGES"], sleep=cfg["BACKUP_SLEEP"])
+    rotated = backup.rotate(cfg["BACKUP_DIR"], cfg["BACKUP_KEEP"])
+    app.extensions["last_backup"] = dict(snap._asdict(), rotated=len(rotated), finished_at=datetime.now().isoformat(timespec="seconds"))
+    backup_logger.info("snapshot %s: %d bytes in %.1f s (%d restarts, %d pages per step), %d rotated out", snap.path,
+                       snap.size, snap.seconds, snap.restarts, snap.pages, len(rotated))
+    return snap, rotated
+
+def backup_job():
+    try:
+        take_backup()
+    except (sqlite3.Error, OSError, backup.BackupError) as e:
+        app.extensions["last_backup"] = {"error": str(e), "finished_at": datetime.now().isoformat(timespec="seconds")}
+        backup_logger.exception("backup failed")
 
 # --- Initialization ---
 def init_db():
-    """Creates tables if they don't exist."""
-    db = get_db()
-    
-    # Create Tables
-    db.execute("""CREATE TABLE IF NOT EXISTS users (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      username TEXT UNIQUE NOT NULL, password_hash TEXT NOT NULL,
-      role TEXT NOT NULL CHECK(role IN ('admin','doctor','patient')),
-      full_name TEXT, email TEXT, phone TEXT, is_active INTEGER DEFAULT 1
-    );""")
-    
-    db.execute("""CREATE TABLE IF NOT EXISTS departments (
-      id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL, description TEXT
-    );""")
-    
-    db.execute("""CREATE TABLE IF NOT EXISTS doctors (
-        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER UNIQUE NOT NULL,
-        department_id INTEGER, experience TEXT, bio TEXT,
-        FOREIGN KEY(user_id) REFERENCES users(id), FOREIGN KEY(department_id) REFERENCES departments(id)
-    );""")
-    
-    db.execute("""CREATE TABLE IF NOT EXISTS patients (
-      id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER UNIQUE NOT NULL,
-      address TEXT, blood_group TEXT, emergency_contact TEXT, age INTEGER,
-      FOREIGN KEY(user_id) REFERENCES users(id)
-    );""")
-    
-    db.execute("""CREATE TABLE IF NOT EXISTS appointments (
-      id INTEGER PRIMARY KEY AUTOINCREMENT, patient_id INTEGER NOT NULL, doctor_id INTEGER NOT NULL,
-      date TEXT NOT NULL, time TEXT NOT NULL, end_time TEXT,
-      status TEXT NOT NULL DEFAULT 'Booked', created_at TEXT NOT NULL,
-      FOREIGN KEY(patient_id) REFERENCES patients(id), FOREIGN KEY(doctor_id) REFERENCES doctors(id)
-    );""")
-    
-    db.execute("""CREATE TABLE IF NOT EXISTS treatments (
-      id INTEGER PRIMARY KEY AUTOINCREMENT, appointment_id INTEGER UNIQUE NOT NULL,
-      diagnosis TEXT, prescription TEXT, notes TEXT,
-      FOREIGN KEY(appointment_id) REFERENCES appointments(id)
-    );""")
-    
-    db.execute("""CREATE TABLE IF NOT EXISTS doctor_availability (
-      id INTEGER PRIMARY KEY AUTOINCREMENT, doctor_id INTEGER NOT NULL,
-      date TEXT NOT NULL, start_time TEXT NOT NULL, end_time TEXT NOT NULL,
-      is_booked INTEGER DEFAULT 0, booked_by INTEGER, booked_at TEXT,
-      FOREIGN KEY(doctor_id) REFERENCES doctors(id)
-    );""")
-    
-    # Migration: Ensure age column exists
+    """Brings the schema up to date; a single PRAGMA read when it already is."""
+    return migrate(get_db())
+
+@app.cli.command("migrations")
+def migrations_command():
+    """Lists schema migrations and whether each has been applied, without applying any."""
+    # A raw read-only connection: get_db() would open the pools, which migrate first.
+    path = app.config["DATABASE"]
+    db = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True) if os.path.exists(path) else sqlite3.connect(":memory:")
     try:
-        db.execute("ALTER TABLE patients ADD COLUMN age INTEGER")
-    except sqlite3.OperationalError:
-        pass
+        click.echo(f"user_version {db.execute('PRAGMA user_version').fetchone()[0]} of {len(MIGRATIONS)}")
+        for version, name, state in migration_status(db):
+            click.echo(f"{version:>4}  {state:<12} {name}")
+    finally:
+        db.close()
 
-    # Default Admin
-    if not db.execute("SELECT id FROM users WHERE role='admin'").fetchone():
-        pw = generate_password_hash("admin123")
-        db.execute("INSERT INTO users (username,password_hash,role,full_name,email) VALUES (?,?,?,?,?)",
-                   ("admin", pw, "admin", "Default Admin", "admin@example.com"))
+@app.cli.command("check-plans")
+def check_plans_command():
+    """Fails if any hot query in schema.HOT_QUERIES plans a full table scan."""
+    init_db()
+    failed = 0
+    for name, plan, ok in check_query_plans(get_db()):
+        click.echo(f"{'ok  ' if ok else 'SCAN'} {name}")
+        for line in plan:
+            click.echo(f"       {line}")
+        failed += not ok
+    if failed:
+        raise click.ClickException(f"{failed} hot queries fall back to a full scan")
+
+@app.cli.command("reconcile-counters")
+@click.option("--fix", is_flag=True, help="Overwrite drifted counters with the recomputed values.")
+def reconcile_counters_command(fix):
+    """Recomputes the trigger-maintained counters and reports any drift."""
+    db = get_db()
+    init_db()
+    drift = counters.reconcile(db, fix=fix)
+    for scope, key, have, want in drift:
+        click.echo(f"{scope}[{key}]: stored {have}, expected {want}")
+    if fix:
         db.commit()
-        print("Created default admin.")
+        click.echo(f"{len(drift)} counters repaired")
+    elif drift:
+        raise click.ClickException(f"{len(drift)} counters drifted; rerun with --fix")
+    else:
+        click.echo("counters ok")
+
+@app.cli.command("compact-slots")
+@click.option("--enable-incremental-vacuum", is_flag=True,
+              help="Switch the file to auto_vacuum=INCREMENTAL first (one full VACUUM).")
+def compact_slots_command(enable_incremental_vacuum):
+    """Deletes expired open slots in batches and reports rows and pages reclaimed."""
+    db = get_db()
+    init_db()
+    if enable_incremental_vacuum:
+        before = compaction.pages(db)[0]
+        compaction.enable_incremental_vacuum(db)
+        click.echo(f"auto_vacuum=INCREMENTAL; VACUUM took pages {before} -> {compaction.pages(db)[0]}")
+    r = compact_slots(db)
+    click.echo(f"{r.rows} expired slots deleted in {r.batches} batches ({r.seconds:.1f} s)")
+    click.echo(f"pages {r.pages_before} -> {r.pages_after}, saved {(r.pages_before - r.pages_after) * r.page_size / 1024:.0f} KB,"
+               f" {r.free_pages} free pages left")
+
+@app.cli.command("archive")
+@click.option("--days", type=int, help="Archive finished appointments older than this many days (default ARCHIVE_AFTER_DAYS).")
+def archive_command(days):
+    """Moves old Completed/Cancelled appointments and their treatments into the archive database."""
+    db = get_db()
+    init_db()
+    days = app.config["ARCHIVE_AFTER_DAYS"] if days is None else days
+    cutoff = date.today() - timedelta(days=days)
+    moved, batches = archive.archive(db, app.config["ARCHIVE_DATABASE"], to_ts(cutoff.isoformat(), "00:00"),
+                                     batch=app.config["ARCHIVE_BATCH"])
+    click.echo(f"{moved} appointments from before {cutoff} archived in {batches} batches to {app.config['ARCHIVE_DATABASE']}")
+
+@app.cli.command("backup")
+def backup_command():
+    """Takes an online snapshot of the database and rotates old ones."""
+    snap, rotated = take_backup()
+    click.echo(f"{snap.path}: {snap.size / 2 ** 20:.1f} MB in {snap.seconds:.1f} s, sha256 {snap.sha256}")
+    for path in rotated:
+        click.echo(f"rotated out {path}")
+
+@app.cli.command("verify-backups")
+def verify_backups_command():
+    """Checks every snapshot in BACKUP_DIR against its checksum and quick_check."""
+    bad = 0
+    for path in backup.snapshots(app.config["BACKUP_DIR"]):
+        try:
+            backup.verify(path)
+            click.echo(f"ok   {path}")
+        except backup.BackupError as e:
+            click.echo(f"FAIL {e}")
+            bad += 1
+    if bad:
+        raise click.ClickException(f"{bad} snapshots failed verification")
+
+@app.cli.command("restore")
+@click.argument("snapshot")
+@click.confirmation_option(prompt="Overwrite the live database with this snapshot? Stop the app first.")
+def restore_command(snapshot):
+    """Verifies SNAPSHOT (a path or a name in BACKUP_DIR) and copies it over the database."""
+    path = snapshot if os.path.exists(snapshot) else os.path.join(app.config["BACKUP_DIR"], snapshot)
+    try:
+        backup.restore(path, app.config["DATABASE"])
+    except backup.BackupError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"restored {app.config['DATABASE']} from {path}")
 
 # --- Utils ---
 def generate_time_slots():
@@ -101,6 +320,34 @@ def generate_time_slots():
     slots.append("21:00")
     return slots
 
+def slot_rows(doctor_id, day, start, end, length):
+    """INSERT_SLOT parameter rows for back-to-back ``length``-minute slots from ``start`` to ``end`` on ``day``."""
+    rows = []
+    for curr in range(time_to_minutes(start), time_to_minutes(end) - length + 1, length):
+        hm = f"{curr // 60:02d}:{curr % 60:02d}"
+        rows.append((doctor_id, day, hm, f"{(curr + length) // 60:02d}:{(curr + length) % 60:02d}", to_ts(day, hm)))
+    return rows
+
+def doctor_search_page(q):
+    """One page of ranked doctor matches for ``q`` (page number from ``?page=``), as directory rows."""
+    page = max(request.args.get("page", 1, type=int), 1)
+    ids, has_next = search_doctor_ids(get_db(), q, page, app.config["SEARCH_PAGE_SIZE"])
+    by_id = get_directory().by_id
+    return [by_id[i] for i in ids if i in by_id], page, has_next
+
+def with_history(db):
+    """True when the page asked for ``?history=1`` and the archive is attached to ``db`` for the history views."""
+    return request.args.get("history") == "1" and archive.attach(db, app.config["ARCHIVE_DATABASE"])
+
+def date_arg(name):
+    """A YYYY-MM-DD query arg, or None when missing or malformed."""
+    value = request.args.get(name, "")
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return None
+    return value
+
 def time_to_minutes(t):
     h, m = map(int, t.split(":"))
     return h * 60 + m
@@ -134,7 +381,8 @@ def login():
     if request.method == "POST":
         u = request.form["username"].strip()
         p = request.form["password"]
-        user = get_db().execute("SELECT * FROM users WHERE username=? AND is_active=1", (u,)).fetchone()
+        # A read: the password check below is slow and must not hold the writer.
+        user = get_db(readonly=True).execute(Q.USER_BY_USERNAME, (u,)).fetchone()
         if user and check_password_hash(user["password_hash"], p):
             session["user_id"] = user["id"]
             session["role"] = user["role"]
@@ -155,12 +403,12 @@ def register_patient():
             flash("Passwords do not match.", "danger")
             return render_template("register_patient.html")
         
+        # Hash before checking out the writer, which the hash would otherwise hold.
+        pw = generate_password_hash(request.form["password"])
         db = get_db()
         try:
-            pw = generate_password_hash(request.form["password"])
-            cur = db.execute("INSERT INTO users (username,password_hash,role,full_name,email,phone) VALUES (?,?,?,?,?,?)",
-                             (request.form["username"], pw, "patient", request.form["full_name"], request.form["email"], request.form["phone"]))
-            db.execute("INSERT INTO patients (user_id) VALUES (?)", (cur.lastrowid,))
+            cur = db.execute(Q.INSERT_USER, (request.form["username"], pw, "patient", request.form["full_name"], request.form["email"], request.form["phone"]))
+            db.execute(Q.INSERT_PATIENT, (cur.lastrowid,))
             db.commit()
             flash("Registered successfully.", "success")
             return redirect(url_for("login"))
@@ -173,93 +421,73 @@ def register_patient():
 @login_required(role="admin")
 def admin_dashboard():
     db = get_db()
-    doc_c = db.execute("SELECT COUNT(*) c FROM doctors").fetchone()["c"]
-    pat_c = db.execute("SELECT COUNT(*) c FROM patients").fetchone()["c"]
-    up_c = db.execute("SELECT COUNT(*) c FROM appointments WHERE datetime(date||' '||time) >= datetime('now') AND status='Booked'").fetchone()["c"]
-    
-    upcoming = db.execute("""
-      SELECT a.id, u.full_name patient_name, u2.full_name doctor_name, a.date, a.time, a.status
-      FROM appointments a JOIN patients p ON a.patient_id=p.id JOIN users u ON p.user_id=u.id JOIN doctors d ON a.doctor_id=d.id JOIN users u2 ON d.user_id=u2.id
-      WHERE datetime(a.date||' '||a.time) >= datetime('now') AND a.status='Booked' ORDER BY a.date, a.time LIMIT 10
-    """).fetchall()
+    doc_c = db.execute(Q.COUNT_DOCTORS).fetchone()["c"]
+    pat_c = db.execute(Q.COUNT_PATIENTS).fetchone()["c"]
+    now = now_ts()
+    up_c = db.execute(Q.COUNT_UPCOMING, (now,)).fetchone()["c"]
     
-    past = db.execute("""
-      SELECT a.id, u.full_name patient_name, u2.full_name doctor_name, a.date, a.time, a.status
-      FROM appointments a JOIN patients p ON a.patient_id=p.id JOIN users u ON p.user_id=u.id JOIN doctors d ON a.doctor_id=d.id JOIN users u2 ON d.user_id=u2.id
-      WHERE datetime(a.date||' '||a.time) < datetime('now') OR a.status != 'Booked' ORDER BY a.date DESC, a.time DESC LIMIT 10
-    """).fetchall()
+    upcoming = db.execute(Q.ADMIN_UPCOMING, (now,)).fetchall()
+    past = db.execute(Q.ADMIN_PAST, (now,)).fetchall()
 
     return render_template("admin_dashboard.html", total_doctors=doc_c, total_patients=pat_c, total_upcoming=up_c, upcoming=upcoming, past=past)
 
 @app.route("/admin/doctors", methods=["GET", "POST"])
 @login_required(role="admin")
 def manage_doctors():
-    db = get_db()
     q = request.args.get("q", "").strip()
     if request.method == "POST":
+        pw = generate_password_hash(request.form["password"])
+        db = get_db()
         try:
-            pw = generate_password_hash(request.form["password"])
-            dept_row = db.execute("SELECT id FROM departments WHERE name=?", (request.form["department"],)).fetchone()
+            dept_row = db.execute(Q.DEPARTMENT_ID_BY_NAME, (request.form["department"],)).fetchone()
             if not dept_row:
-                db.execute("INSERT INTO departments (name) VALUES (?)", (request.form["department"],))
-                dept_id = db.execute("SELECT last_insert_rowid()").fetchone()[0]
+                dept_id = db.execute(Q.INSERT_DEPARTMENT, (request.form["department"], None)).lastrowid
             else:
                 dept_id = dept_row["id"]
                 
-            cur = db.execute("INSERT INTO users (username,password_hash,role,full_name,email,phone) VALUES (?,?,?,?,?,?)",
+            cur = db.execute(Q.INSERT_USER,
                        (request.form["username"], pw, "doctor", request.form["full_name"], request.form["email"], request.form["phone"]))
-            db.execute("INSERT INTO doctors (user_id, department_id, experience) VALUES (?,?,?)",
-                       (cur.lastrowid, dept_id, request.form.get("experience")))
+            db.execute(Q.INSERT_DOCTOR, (cur.lastrowid, dept_id, request.form.get("experience")))
             db.commit()
             flash("Doctor added.", "success")
         except sqlite3.IntegrityError:
             flash("Error adding doctor.", "danger")
 
-    # SEARCH FIX: Added "OR dep.name LIKE ?" to allow searching by specialization
-    query = """
-        SELECT d.id, u.full_name, u.username, u.email, u.phone, dep.name department, d.experience 
-        FROM doctors d 
-        JOIN users u ON d.user_id=u.id 
-        LEFT JOIN departments dep ON d.department_id=dep.id
-    """
-    params = []
+    page, has_next = 1, False
     if q:
-        query += " WHERE u.full_name LIKE ? OR u.username LIKE ? OR u.email LIKE ? OR dep.name LIKE ?"
-        like = f"%{q}%"
-        params = [like, like, like, like]
-        
-    query += " ORDER BY u.full_name"
-    
-    doctors = db.execute(query, params).fetchall()
-    return render_template("admin_doctors.html", doctors=doctors, q=q)
+        doctors, page, has_next = doctor_search_page(q)
+    else:
+        doctors = get_directory().doctors
+    return render_template("admin_doctors.html", doctors=doctors, q=q, page=page, has_next=has_next)
 
 @app.route("/admin/doctors/<int:doctor_id>")
 @login_required(role="admin")
 def admin_view_doctor(doctor_id):
     db = get_db()
-    doctor = db.execute("SELECT d.id, u.username, u.full_name, u.email, u.phone, u.is_active, d.experience, dep.name as department FROM doctors d JOIN users u ON d.user_id=u.id LEFT JOIN departments dep ON d.department_id=dep.id WHERE d.id=?", (doctor_id,)).fetchone()
-    appts = db.execute("SELECT a.id, a.date, a.time, a.status, u.full_name as patient_name FROM appointments a JOIN patients p ON a.patient_id=p.id JOIN users u ON p.user_id=u.id WHERE a.doctor_id=? ORDER BY a.date DESC LIMIT 20", (doctor_id,)).fetchall()
+    doctor = db.execute(Q.DOCTOR_DETAIL, (doctor_id,)).fetchone()
+    appts = db.execute(Q.DOCTOR_RECENT_APPOINTMENTS, (doctor_id,)).fetchall()
     return render_template("admin_view_doctor.html", doctor=doctor, appts=appts)
 
 @app.route("/admin/doctors/<int:doctor_id>/edit", methods=["GET","POST"])
 @login_required(role="admin")
 def admin_edit_doctor(doctor_id):
     db = get_db()
-    doctor = db.execute("SELECT d.*, u.full_name, u.email, u.phone FROM doctors d JOIN users u ON d.user_id=u.id WHERE d.id=?", (doctor_id,)).fetchone()
+    doctor = db.execute(Q.DOCTOR_FOR_EDIT, (doctor_id,)).fetchone()
     if request.method == "POST":
-        db.execute("UPDATE users SET full_name=?, email=?, phone=? WHERE id=?", (request.form["full_name"], request.form["email"], request.form["phone"], doctor["user_id"]))
-        db.execute("UPDATE doctors SET experience=? WHERE id=?", (request.form["experience"], doctor_id))
+        db.execute(Q.UPDATE_USER_CONTACT, (request.form["full_name"], request.form["email"], request.form["phone"], doctor["user_id"]))
+        db.execute(Q.UPDATE_DOCTOR_EXPERIENCE, (request.form["experience"], doctor_id))
         db.commit()
         return redirect(url_for("admin_view_doctor", doctor_id=doctor_id))
-    depts = db.execute("SELECT * FROM departments").fetchall()
+    depts = db.execute(Q.ALL_DEPARTMENTS).fetchall()
     return render_template("admin_edit_doctor.html", doctor=doctor, departments=depts)
 
 @app.route("/admin/doctors/<int:doctor_id>/delete", methods=["POST"])
 @login_required(role="admin")
 def admin_delete_doctor(doctor_id):
     db = get_db()
-    uid = db.execute("SELECT user_id FROM doctors WHERE id=?", (doctor_id,)).fetchone()["user_id"]
-    db.execute("UPDATE users SET is_active=0 WHERE id=?", (uid,))
+    uid = db.execute(Q.DOCTOR_USER_ID, (doctor_id,)).fetchone()["user_id"]
+    db.execute(Q.SET_USER_ACTIVE, (0, uid))
+    db.commit()
     flash("Doctor deactivated.", "success")
     return redirect(url_for("manage_doctors"))
 
@@ -268,24 +496,26 @@ def admin_delete_doctor(doctor_id):
 def admin_list_patients():
     db = get_db()
     q = request.args.get("q", "").strip()
-    sql = "SELECT p.id, u.id as user_id, u.full_name, u.username, u.email, u.phone, u.is_active FROM patients p JOIN users u ON p.user_id=u.id"
-    if q: sql += f" WHERE u.full_name LIKE '%{q}%' OR u.username LIKE '%{q}%'"
-    return render_template("admin_patients.html", patients=db.execute(sql).fetchall(), q=q)
+    after = request.args.get("after", 0, type=int)
+    page = patient_page(db, q, after, app.config["PATIENT_PAGE_SIZE"], request.args.get("after_name"))
+    return stream_template("admin_patients.html", patients=RowStream(page.rows), q=q, after=after, page=page,
+                           page_size=app.config["PATIENT_PAGE_SIZE"])
 
 @app.route("/admin/patients/<int:patient_id>")
 @login_required(role="admin")
 def admin_view_patient(patient_id):
     db = get_db()
-    patient = db.execute("SELECT p.id, u.full_name, u.username, u.email, u.phone, p.address, p.blood_group, p.emergency_contact, p.age FROM patients p JOIN users u ON p.user_id=u.id WHERE p.id=?", (patient_id,)).fetchone()
-    appointments = db.execute("SELECT a.id, a.date, a.time, a.status, d.id as doctor_id, u.full_name as doctor_name, t.diagnosis, t.prescription FROM appointments a JOIN doctors d ON a.doctor_id=d.id JOIN users u ON d.user_id=u.id LEFT JOIN treatments t ON t.appointment_id=a.id WHERE a.patient_id=? ORDER BY a.date DESC", (patient_id,)).fetchall()
-    return render_template("admin_view_patient.html", patient=patient, appointments=appointments)
+    patient = db.execute(Q.PATIENT_DETAIL, (patient_id,)).fetchone()
+    history = with_history(db)
+    appointments = db.execute(Q.PATIENT_APPOINTMENTS_HISTORY if history else Q.PATIENT_APPOINTMENTS, (patient_id,))
+    return stream_template("admin_view_patient.html", patient=patient, appointments=appointments, history=history)
 
 @app.route("/admin/users/<int:user_id>/deactivate", methods=["POST"])
 @login_required(role="admin")
 def admin_deactivate_user(user_id):
     db = get_db()
-    curr = db.execute("SELECT is_active FROM users WHERE id=?", (user_id,)).fetchone()["is_active"]
-    db.execute("UPDATE users SET is_active=? WHERE id=?", (0 if curr else 1, user_id))
+    curr = db.execute(Q.USER_IS_ACTIVE, (user_id,)).fetchone()["is_active"]
+    db.execute(Q.SET_USER_ACTIVE, (0 if curr else 1, user_id))
     db.commit()
     return redirect(request.referrer)
 
@@ -295,10 +525,10 @@ def admin_departments():
     db = get_db()
     if request.method == "POST":
         try:
-            db.execute("INSERT INTO departments (name, description) VALUES (?, ?)", (request.form["name"], request.form.get("description")))
+            db.execute(Q.INSERT_DEPARTMENT, (request.form["name"], request.form.get("description")))
             db.commit()
         except: pass
-    depts = db.execute("SELECT dep.id, dep.name, dep.description, COUNT(d.id) as doctor_count FROM departments dep LEFT JOIN doctors d ON dep.id=d.department_id GROUP BY dep.id ORDER BY dep.name").fetchall()
+    depts = db.execute(Q.DEPARTMENT_LIST_WITH_COUNTS).fetchall()
     return render_template("admin_departments.html", depts=depts)
 
 @app.route("/admin/departments/<int:dept_id>/edit", methods=["GET", "POST"])
@@ -306,10 +536,10 @@ def admin_departments():
 def admin_edit_department(dept_id):
     db = get_db()
     if request.method=="POST":
-        db.execute("UPDATE departments SET name=?, description=? WHERE id=?", (request.form["name"], request.form["description"], dept_id))
+        db.execute(Q.UPDATE_DEPARTMENT, (request.form["name"], request.form["description"], dept_id))
         db.commit()
         return redirect(url_for("admin_departments"))
-    dept = db.execute("SELECT * FROM departments WHERE id=?", (dept_id,)).fetchone()
+    dept = db.execute(Q.DEPARTMENT_BY_ID, (dept_id,)).fetchone()
     return render_template("admin_edit_department.html", dept=dept)
 
 @app.route("/admin/appointments")
@@ -317,14 +547,64 @@ def admin_edit_department(dept_id):
 def admin_appointments():
     db = get_db()
     ft = request.args.get("filter", "all")
-    sql = """SELECT a.id, a.date, a.time, a.status, up.full_name as patient_name, up.phone as patient_phone, ud.full_name as doctor_name, dep.name as department 
-             FROM appointments a JOIN patients p ON a.patient_id=p.id JOIN users up ON p.user_id=up.id 
-             JOIN doctors d ON a.doctor_id=d.id JOIN users ud ON d.user_id=ud.id LEFT JOIN departments dep ON d.department_id=dep.id"""
-    if ft == 'upcoming': sql += " WHERE datetime(a.date||' '||a.time) >= datetime('now') AND a.status='Booked' ORDER BY a.date, a.time"
-    elif ft == 'past': sql += " WHERE datetime(a.date||' '||a.time) < datetime('now') OR a.status != 'Booked' ORDER BY a.date DESC"
-    else: sql += " ORDER BY a.date DESC"
-    rows = db.execute(sql + " LIMIT 1000").fetchall()
-    return render_template("admin_appointments.html", rows=rows, filter_type=ft)
+    params = {}
+    if request.args.get("doctor_id", type=int):
+        params["doctor_id"] = request.args.get("doctor_id", type=int)
+    if request.args.get("department"):
+        params["department"] = request.args["department"]
+    if request.args.get("status") in ("Booked", "Completed", "Cancelled"):
+        params["status"] = request.args["status"]
+    if date_arg("from"):
+        params["start"] = to_ts(date_arg("from"), "00:00")
+    if date_arg("to"):
+        params["end"] = to_ts(date_arg("to"), "00:00") + 86400
+    if ft == 'upcoming':
+        params["status"] = "Booked"
+        params["start"] = max(params.get("start", 0), now_ts())
+    elif ft == 'past':
+        params["past"] = now_ts()
+
+    # Cursor is "<start_ts>_<id>" of the last row shown; upcoming runs forwards, everything else newest first.
+    descending = ft != 'upcoming'
+    after_ts, _, after_id = request.args.get("after", "").partition("_")
+    if after_ts.lstrip("-").isdigit() and after_id.isdigit():
+        params["after_ts"], params["after_id"] = int(after_ts), int(after_id)
+    else:
+        params["after_ts"] = params["after_id"] = (1 << 62) * (1 if descending else -1)
+    params["limit"] = app.config["APPOINTMENT_PAGE_SIZE"]
+
+    filters = tuple(f for f in Q.APPOINTMENT_FILTERS if f in params)
+    args = request.args.to_dict()
+    args.pop("after", None)
+
+    def page_url(last=None):
+        """First page when ``last`` is None, otherwise the page after row ``last``."""
+        return url_for("admin_appointments", **args, after=f"{last['start_ts']}_{last['id']}" if last else None)
+
+    doctors, departments = get_directory().doctors, db.execute(Q.DEPARTMENT_NAMES).fetchall()
+    rows = RowStream(db.execute(Q.APPOINTMENT_PAGES[filters, descending], params))
+    return stream_template("admin_appointments.html", rows=rows, filter_type=ft, page_url=page_url,
+                           page_size=params["limit"], paged="after" in request.args,
+                           doctors=doctors, departments=departments)
+
+@app.route("/admin/db/backup", methods=["POST"])
+@login_required(role="admin")
+def admin_backup():
+    job = app.extensions.get("backup_job")
+    if job and job.is_alive():
+        flash("A backup is already running.", "warning")
+    else:
+        app.extensions["backup_job"] = threading.Thread(target=backup_job, name="backup", daemon=True)
+        app.extensions["backup_job"].start()
+        flash("Backup started; its result appears under /admin/db/stats.", "info")
+    return redirect(url_for("admin_dashboard"))
+
+@app.route("/admin/db/stats")
+@login_required(role="admin")
+def admin_db_stats():
+    return jsonify(pools={"read": get_pool(True).stats(), "write": get_pool().stats()},
+                   statements=Q.STATS.snapshot(), directory=app.extensions["doctor_directory"].stats(),
+                   compaction=app.extensions.get("last_compaction"), backup=app.extensions.get("last_backup"))
 
 # --- Doctor ---
 @app.route("/doctor/dashboard")
@@ -332,19 +612,16 @@ def admin_appointments():
 def doctor_dashboard():
     db = get_db()
     user_id = session["user_id"]
-    doctor = db.execute("SELECT * FROM doctors WHERE user_id=?", (user_id,)).fetchone()
+    doctor = db.execute(Q.DOCTOR_BY_USER, (user_id,)).fetchone()
     
-    pat_count = db.execute("SELECT COUNT(DISTINCT patient_id) c FROM appointments WHERE doctor_id=?", (doctor["id"],)).fetchone()["c"]
-    today_count = db.execute("SELECT COUNT(*) c FROM appointments WHERE doctor_id=? AND date=? AND status='Booked'", (doctor["id"], date.today().isoformat())).fetchone()["c"]
-    active_count = db.execute("SELECT COUNT(*) c FROM appointments WHERE doctor_id=? AND datetime(date||' '||time) >= datetime('now') AND status='Booked'", (doctor["id"],)).fetchone()["c"]
+    pat_count = db.execute(Q.DOCTOR_PATIENT_COUNT, (doctor["id"],)).fetchone()["c"]
+    day_start = to_ts(date.today().isoformat(), "00:00")
+    today_count = db.execute(Q.DOCTOR_TODAY_COUNT, (doctor["id"], day_start, day_start + 86400)).fetchone()["c"]
+    active_count = db.execute(Q.DOCTOR_ACTIVE_COUNT, (doctor["id"], now_ts())).fetchone()["c"]
     
-    active_appts = db.execute("""
-        SELECT a.id, a.date, a.time, u.full_name as patient_name, p.id as patient_id 
-        FROM appointments a JOIN patients p ON a.patient_id=p.id JOIN users u ON p.user_id=u.id
-        WHERE a.doctor_id=? AND a.status='Booked' ORDER BY a.date, a.time
-    """, (doctor["id"],)).fetchall()
+    active_appts = db.execute(Q.DOCTOR_ACTIVE_APPOINTMENTS, (doctor["id"],)).fetchall()
     
-    patients = db.execute("SELECT DISTINCT p.id as patient_id, u.full_name, u.phone FROM appointments a JOIN patients p ON a.patient_id=p.id JOIN users u ON p.user_id=u.id WHERE a.doctor_id=?", (doctor["id"],)).fetchall()
+    patients = db.execute(Q.DOCTOR_PATIENTS, (doctor["id"],)).fetchall()
     
     return render_template("doctor_dashboard.html", doctor=doctor, total_patients=pat_count, today_count=today_count, active_count=active_count, active_appts=active_appts, patients=patients)
 
@@ -352,136 +629,200 @@ def doctor_dashboard():
 @login_required(role="doctor")
 def doctor_availability():
     db = get_db()
-    doc_id = db.execute("SELECT id FROM doctors WHERE user_id=?", (session["user_id"],)).fetchone()["id"]
+    doc_id = db.execute(Q.DOCTOR_ID_BY_USER, (session["user_id"],)).fetchone()["id"]
     
+    horizon = min(max(request.values.get("days", app.config["AVAILABILITY_DAYS"], type=int), 1), 90)
     days = []
-    for i in range(7):
+    for i in range(horizon):
         d = date.today() + timedelta(days=i)
         days.append({"iso": d.isoformat(), "label": d.strftime("%A")})
         
     if request.method == "POST":
         slot = int(request.form.get("slot_length", "15"))
-        for d in days:
-            iso = d["iso"]
-            if request.form.get(f"enable_{iso}"):
-                # 1. Clear unbooked slots for this day to avoid duplicates
-                db.execute("DELETE FROM doctor_availability WHERE doctor_id=? AND date=? AND is_booked=0", (doc_id, iso))
-                
-                # 2. Generate new slots
-                start, end = request.form.get(f"start_{iso}"), request.form.get(f"end_{iso}")
-                curr, limit = time_to_minutes(start), time_to_minutes(end)
-                
-                while curr + slot <= limit:
-                    s_str = f"{curr//60:02d}:{curr%60:02d}"
-                    e_str = f"{(curr+slot)//60:02d}:{(curr+slot)%60:02d}"
-                    
-                    # FIX: Use INSERT OR IGNORE to prevent crashes if a booked slot already exists at this time
-                    db.execute("""
-                        INSERT OR IGNORE INTO doctor_availability 
-                        (doctor_id, date, start_time, end_time, is_booked) 
-                        VALUES (?, ?, ?, ?, 0)
-                    """, (doc_id, iso, s_str, e_str))
-                    
-                    curr += slot
+        enabled = [d["iso"] for d in days if request.form.get(f"enable_{d['iso']}")]
+        rows = []
+        for iso in enabled:
+            rows += slot_rows(doc_id, iso, request.form.get(f"start_{iso}"), request.form.get(f"end_{iso}"), slot)
+        # Open slots on the enabled days are regenerated; booked ones stay and their start times are skipped by OR IGNORE.
+        db.executemany(Q.DELETE_OPEN_SLOTS_FOR_DAY, [(doc_id, iso) for iso in enabled])
+        db.executemany(Q.INSERT_SLOT, rows)
         db.commit()
         flash("Availability updated successfully.", "success")
-        return redirect(url_for('doctor_availability')) 
+        return redirect(url_for('doctor_availability', days=horizon)) 
 
-    # Load saved state
-    slots_summary = {}
+    # Load saved state: one grouped query for the whole horizon
+    slots_summary = {row["date"]: row for row in db.execute(Q.SLOT_SUMMARY, (doc_id, days[0]["iso"], days[-1]["iso"]))}
     for d in days:
-        existing = db.execute("SELECT start_time, end_time, is_booked FROM doctor_availability WHERE doctor_id=? AND date=? ORDER BY start_time", (doc_id, d["iso"])).fetchall()
-        count = len(existing)
-        slots_summary[d["iso"]] = {"total": count, "booked": sum(1 for s in existing if s["is_booked"])}
-        
-        if count > 0:
+        summary = slots_summary.get(d["iso"])
+        if summary:
             d["enabled"] = True
-            d["start_time"] = existing[0]["start_time"]
-            d["end_time"] = existing[-1]["end_time"]
+            d["start_time"] = summary["start_time"]
+            d["end_time"] = summary["end_time"]
         else:
             d["enabled"] = False
             d["start_time"] = "09:00"
             d["end_time"] = "17:00"
 
-    return render_template("doctor_availability.html", days=days, time_slots=generate_time_slots(), slots_summary=slots_summary)
+    return render_template("doctor_availability.html", days=days, horizon=horizon, time_slots=generate_time_slots(), slots_summary=slots_summary)
 @app.route("/doctor/complete/<int:appointment_id>", methods=["GET", "POST"])
 @login_required(role="doctor")
 def doctor_complete_appointment(appointment_id):
     db = get_db()
     if request.method=="POST":
-        db.execute("UPDATE appointments SET status='Completed' WHERE id=?", (appointment_id,))
-        db.execute("INSERT OR REPLACE INTO treatments (appointment_id, diagnosis, prescription, notes) VALUES (?,?,?,?)",
-                   (appointment_id, request.form["diagnosis"], request.form["prescription"], request.form["notes"]))
+        db.execute(Q.COMPLETE_APPOINTMENT, (appointment_id,))
+        db.execute(Q.UPSERT_TREATMENT, (appointment_id, request.form["diagnosis"], request.form["prescription"], request.form["notes"]))
         db.commit()
         return redirect(url_for("doctor_dashboard"))
         
-    appt = db.execute("SELECT a.*, u.full_name as patient_name FROM appointments a JOIN patients p ON a.patient_id=p.id JOIN users u ON p.user_id=u.id WHERE a.id=?", (appointment_id,)).fetchone()
-    treatment = db.execute("SELECT * FROM treatments WHERE appointment_id=?", (appointment_id,)).fetchone()
-    past = db.execute("SELECT a.date as appt_date, a.time as appt_time, t.* FROM treatments t JOIN appointments a ON t.appointment_id=a.id WHERE a.patient_id=? AND a.id!=? ORDER BY a.date DESC", (appt["patient_id"], appointment_id)).fetchall()
+    appt = db.execute(Q.APPOINTMENT_WITH_PATIENT, (appointment_id,)).fetchone()
+    treatment = db.execute(Q.TREATMENT_BY_APPOINTMENT, (appointment_id,)).fetchone()
+    past = db.execute(Q.PAST_TREATMENTS, (appt["patient_id"], appointment_id)).fetchall()
     return render_template("doctor_complete.html", appt=appt, treatment=treatment, past_treatments=past)
 
 @app.route("/doctor/patient/<int:patient_id>/history")
 @login_required(role="doctor")
 def doctor_view_patient_history(patient_id):
     db = get_db()
-    doc = db.execute("SELECT id FROM doctors WHERE user_id=?", (session["user_id"],)).fetchone()
-    patient = db.execute("SELECT p.id as patient_id, u.full_name, u.email, u.phone, p.address, p.blood_group, p.age FROM patients p JOIN users u ON p.user_id=u.id WHERE p.id=?", (patient_id,)).fetchone()
-    records = db.execute("SELECT a.id as appt_id, a.date, a.time, a.status, a.doctor_id, t.diagnosis, t.prescription, t.notes FROM appointments a LEFT JOIN treatments t ON t.appointment_id=a.id WHERE a.patient_id=? AND a.status='Completed' ORDER BY a.date DESC", (patient_id,)).fetchall()
-    return render_template("doctor_view_patient_history.html", patient=patient, records=records, current_doctor_id=doc["id"])
+    doc = db.execute(Q.DOCTOR_ID_BY_USER, (session["user_id"],)).fetchone()
+    patient = db.execute(Q.PATIENT_SUMMARY, (patient_id,)).fetchone()
+    history = with_history(db)
+    records = db.execute(Q.PATIENT_COMPLETED_RECORDS_HISTORY if history else Q.PATIENT_COMPLETED_RECORDS, (patient_id,)).fetchall()
+    return render_template("doctor_view_patient_history.html", patient=patient, records=records, current_doctor_id=doc["id"],
+                           history=history)
 
 @app.route("/doctor/patients")
 def doctor_assigned_patients(): return redirect(url_for("doctor_dashboard"))
 
 # --- Patient ---
+def earliest_slots(db, doctor_ids, start, end, n):
+    """The ``n`` earliest open slots across ``doctor_ids`` with start_ts in [start, end).
+
+    A k-way heap merge over each doctor's calendar: the heap holds every
+    doctor's next open slot, and popping one fetches only that doctor's
+    following slot, so a search costs one indexed lookup per doctor plus one
+    per result however many slots the doctors have. Each lookup is a single
+    fetchone, leaving the cached statement free for the next; holding one open
+    cursor per doctor would re-prepare it every time.
+    """
+    heap = []
+    for doctor_id in doctor_ids:
+        slot = db.execute(Q.FIRST_OPEN_SLOT, (doctor_id, start, end)).fetchone()
+        if slot:
+            heap.append((slot["start_ts"], doctor_id, slot))
+    heapq.heapify(heap)
+    slots = []
+    while heap and len(slots) < n:
+        start_ts, doctor_id, slot = heapq.heappop(heap)
+        slots.append(slot)
+        slot = db.execute(Q.NEXT_OPEN_SLOT, (doctor_id, start_ts, end)).fetchone()
+        if slot:
+            heapq.heappush(heap, (slot["start_ts"], doctor_id, slot))
+    return slots
+
+def open_slot_window(db, doctor_id):
+    """A doctor's open slots over SLOT_WINDOW_DAYS days from ``?from=`` (default today), never before now.
+
+    Returns the slots with the window's first day and the ``from`` values of
+    the previous (None on the first page) and next windows.
+    """
+    today = date.today()
+    first = max(datetime.strptime(date_arg("from") or today.isoformat(), "%Y-%m-%d").date(), today)
+    days = timedelta(days=app.config["SLOT_WINDOW_DAYS"])
+    start = max(to_ts(first.isoformat(), "00:00"), now_ts() + 1)
+    slots = db.execute(Q.OPEN_SLOTS_IN_WINDOW, (doctor_id, start, to_ts((first + days).isoformat(), "00:00"))).fetchall()
+    prev = max(first - days, today).isoformat() if first > today else None
+    return slots, first, prev, (first + days).isoformat()
+
+def book_slot(db, slot, patient_id):
+    """Claims ``slot`` and records the appointment in one BEGIN IMMEDIATE transaction.
+
+    Returns the new appointment id, or None when the slot was already taken.
+    """
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        if db.execute(Q.CLAIM_SLOT, (patient_id, datetime.now().isoformat(), slot["id"])).rowcount == 0:
+            db.rollback()
+            return None
+        cur = db.execute(Q.INSERT_APPOINTMENT,
+                         (patient_id, slot["doctor_id"], slot["date"], slot["start_time"], slot["end_time"], 'Booked', datetime.now().isoformat(),
+                          to_ts(slot["date"], slot["start_time"]), to_ts(slot["date"], slot["end_time"])))
+        db.commit()
+        return cur.lastrowid
+    except Exception:
+        db.rollback()
+        raise
+
 @app.route("/patient/dashboard")
 @login_required(role="patient")
 def patient_dashboard():
     db = get_db()
     user_id = session["user_id"]
-    patient = db.execute("SELECT * FROM patients WHERE user_id=?", (user_id,)).fetchone()
+    patient = db.execute(Q.PATIENT_BY_USER, (user_id,)).fetchone()
     
     q = request.args.get("q", "").strip()
-    search_results = []
+    search_results, page, has_next = [], 1, False
     if q:
-        search_results = db.execute("""
-          SELECT d.id, u.full_name, dep.name as department 
-          FROM doctors d JOIN users u ON d.user_id=u.id LEFT JOIN departments dep ON d.department_id=dep.id 
-          WHERE u.full_name LIKE ? OR dep.name LIKE ? OR u.username LIKE ?
-        """, (f"%{q}%", f"%{q}%", f"%{q}%")).fetchall()
+        search_results, page, has_next = doctor_search_page(q)
         
-    upcoming = db.execute("SELECT a.id, a.date, a.time, a.status, u.full_name as doctor_name, d.id as doctor_id FROM appointments a JOIN doctors d ON a.doctor_id=d.id JOIN users u ON d.user_id=u.id WHERE a.patient_id=? AND datetime(a.date||' '||a.time) >= datetime('now') AND a.status='Booked' ORDER BY a.date, a.time", (patient["id"],)).fetchall()
-    past = db.execute("SELECT a.id, a.date, a.time, a.status, u.full_name as doctor_name, t.diagnosis, t.prescription, t.notes FROM appointments a JOIN doctors d ON a.doctor_id=d.id JOIN users u ON d.user_id=u.id LEFT JOIN treatments t ON t.appointment_id=a.id WHERE a.patient_id=? AND (datetime(a.date||' '||a.time) < datetime('now') OR a.status!='Booked') ORDER BY a.date DESC", (patient["id"],)).fetchall()
+    upcoming = db.execute(Q.PATIENT_UPCOMING, (patient["id"], now_ts())).fetchall()
+    past = db.execute(Q.PATIENT_PAST, (patient["id"], now_ts())).fetchall()
     
-    depts = db.execute("SELECT name FROM departments ORDER BY name").fetchall()
-    docs = db.execute("SELECT d.id, u.full_name, dep.name as department FROM doctors d JOIN users u ON d.user_id=u.id LEFT JOIN departments dep ON d.department_id=dep.id LIMIT 4").fetchall()
+    depts = db.execute(Q.DEPARTMENT_NAMES).fetchall()
+    docs = get_directory().strip
     
-    return render_template("patient_dashboard.html", patient=patient, upcoming=upcoming, past=past, departments=depts, doctors=docs, search_results=search_results, q=q)
+    return render_template("patient_dashboard.html", patient=patient, upcoming=upcoming, past=past, departments=depts, doctors=docs, search_results=search_results, q=q, page=page, has_next=has_next)
+
+@app.route("/patient/earliest")
+@login_required(role="patient")
+def patient_earliest_slots():
+    db = get_db()
+    department = request.args.get("department", "")
+    start = end = None
+    try:
+        start = datetime.strptime(request.args.get("from", ""), "%Y-%m-%dT%H:%M")
+    except ValueError:
+        pass
+    try:
+        end = datetime.strptime(request.args.get("to", ""), "%Y-%m-%dT%H:%M")
+    except ValueError:
+        pass
+    start = max(start or datetime.now(), datetime.now()).replace(second=0, microsecond=0)
+    end = end or start + timedelta(days=14)
+
+    slots = []
+    if department:
+        doctor_ids = [row["id"] for row in db.execute(Q.DEPARTMENT_ACTIVE_DOCTORS, (department,))]
+        slots = earliest_slots(db, doctor_ids, to_ts(start.strftime("%Y-%m-%d"), start.strftime("%H:%M")),
+                               to_ts(end.strftime("%Y-%m-%d"), end.strftime("%H:%M")), app.config["EARLIEST_SLOTS"])
+    depts = db.execute(Q.DEPARTMENT_NAMES).fetchall()
+    return render_template("patient_earliest_slots.html", departments=depts, department=department, slots=slots,
+                           doctors=get_directory().by_id, start=start, end=end)
 
 @app.route("/patient/doctor/<int:doctor_id>/availability")
 @login_required(role="patient")
 def patient_view_doctor_availability(doctor_id):
     db = get_db()
-    doctor = db.execute("SELECT d.id, u.full_name, dep.name as department FROM doctors d JOIN users u ON d.user_id=u.id LEFT JOIN departments dep ON d.department_id=dep.id WHERE d.id=?", (doctor_id,)).fetchone()
-    slots = db.execute("SELECT * FROM doctor_availability WHERE doctor_id=? AND is_booked=0 ORDER BY date, start_time", (doctor_id,)).fetchall()
-    valid = [s for s in slots if datetime.strptime(f"{s['date']} {s['start_time']}", "%Y-%m-%d %H:%M") > datetime.now()]
-    return render_template("patient_doctor_slots.html", doctor=doctor, slots=valid)
+    doctor = db.execute(Q.DOCTOR_CARD, (doctor_id,)).fetchone()
+    slots, first, prev, next_from = open_slot_window(db, doctor_id)
+    return render_template("patient_doctor_slots.html", doctor=doctor, slots=slots, first=first, prev=prev, next_from=next_from)
 
 @app.route("/patient/book/<int:slot_id>", methods=["GET", "POST"])
 @login_required(role="patient")
 def patient_book_slot(slot_id):
     db = get_db()
-    slot = db.execute("SELECT da.*, u.full_name as doctor_name FROM doctor_availability da JOIN doctors d ON da.doctor_id=d.id JOIN users u ON d.user_id=u.id WHERE da.id=?", (slot_id,)).fetchone()
-    
+    slot = db.execute(Q.SLOT_WITH_DOCTOR, (slot_id,)).fetchone()
+    if slot is None:
+        flash("Slot not found.", "warning")
+        return redirect(url_for("patient_dashboard"))
+
     if request.method == "POST":
-        pat = db.execute("SELECT id FROM patients WHERE user_id=?", (session["user_id"],)).fetchone()
+        pat = db.execute(Q.PATIENT_ID_BY_USER, (session["user_id"],)).fetchone()
         try:
-            cur = db.execute("INSERT INTO appointments (patient_id, doctor_id, date, time, end_time, status, created_at) VALUES (?,?,?,?,?,?,?)",
-                       (pat["id"], slot["doctor_id"], slot["date"], slot["start_time"], slot["end_time"], 'Booked', datetime.now().isoformat()))
-            db.execute("UPDATE doctor_availability SET is_booked=1 WHERE id=?", (slot_id,))
-            db.commit()
-            return render_template("patient_booking_success.html", appt_id=cur.lastrowid)
-        except:
-            db.rollback()
+            appt_id = book_slot(db, slot, pat["id"])
+            if appt_id is not None:
+                return render_template("patient_booking_success.html", appt_id=appt_id)
+            flash("Sorry, that slot has just been booked. Please choose another.", "warning")
+        except sqlite3.Error:
             flash("Booking failed.", "danger")
     return render_template("patient_confirm_book.html", slot=slot)
 
@@ -491,20 +832,19 @@ def patient_profile():
     db = get_db()
     uid = session["user_id"]
     if request.method == "POST":
-        db.execute("UPDATE users SET full_name=?, email=?, phone=? WHERE id=?", (request.form["full_name"], request.form["email"], request.form["phone"], uid))
-        db.execute("UPDATE patients SET address=?, blood_group=?, emergency_contact=?, age=? WHERE user_id=?",
+        db.execute(Q.UPDATE_USER_CONTACT, (request.form["full_name"], request.form["email"], request.form["phone"], uid))
+        db.execute(Q.UPDATE_PATIENT_PROFILE,
                    (request.form["address"], request.form["blood_group"], request.form["emergency_contact"], request.form["age"], uid))
         db.commit()
         session["full_name"] = request.form["full_name"]
         flash("Profile updated.", "success")
-    user = db.execute("SELECT * FROM users WHERE id=?", (uid,)).fetchone()
-    patient = db.execute("SELECT * FROM patients WHERE user_id=?", (uid,)).fetchone()
+    user = db.execute(Q.USER_BY_ID, (uid,)).fetchone()
+    patient = db.execute(Q.PATIENT_BY_USER, (uid,)).fetchone()
     return render_template("patient_profile.html", user=user, patient=patient)
 
 @app.route("/patient/doctors/all")
 def patient_all_doctors():
-    db = get_db()
-    docs = db.execute("SELECT d.id, u.full_name, dep.name as department FROM doctors d JOIN users u ON d.user_id=u.id LEFT JOIN departments dep ON d.department_id=dep.id ORDER BY u.full_name").fetchall()
+    docs = get_directory().doctors
     return render_template("patient_all_doctors.html", doctors=docs)
 
 @app.route("/search/doctors")
@@ -513,9 +853,8 @@ def search_doctors(): return redirect(url_for("patient_dashboard"))
 @app.route("/doctor/<int:doctor_id>/profile")
 @login_required(role="patient")
 def patient_view_doctor_profile(doctor_id):
-    db = get_db()
     # FIX: Removed 'd.bio' to prevent crash
-    doctor = db.execute("SELECT d.id, u.full_name, u.email, u.phone, d.experience, dep.name as department FROM doctors d JOIN users u ON d.user_id=u.id LEFT JOIN departments dep ON d.department_id=dep.id WHERE d.id=?", (doctor_id,)).fetchone()
+    doctor = get_directory().by_id.get(doctor_id)
     return render_template("patient_view_doctor.html", doctor=doctor)
 
 # --- Shared Cancel ---
@@ -523,11 +862,10 @@ def patient_view_doctor_profile(doctor_id):
 @login_required()
 def shared_cancel_appointment(appointment_id):
     db = get_db()
-    appt = db.execute("SELECT * FROM appointments WHERE id=?", (appointment_id,)).fetchone()
+    appt = db.execute(Q.APPOINTMENT_BY_ID, (appointment_id,)).fetchone()
     if appt and appt["status"] == 'Booked':
-        db.execute("UPDATE appointments SET status='Cancelled' WHERE id=?", (appointment_id,))
-        db.execute("UPDATE doctor_availability SET is_booked=0 WHERE doctor_id=? AND date=? AND start_time=?", 
-                   (appt["doctor_id"], appt["date"], appt["time"]))
+        db.execute(Q.CANCEL_APPOINTMENT, (appointment_id,))
+        db.execute(Q.RELEASE_SLOT, (appt["doctor_id"], appt["date"], appt["time"]))
         db.commit()
         flash("Appointment cancelled.", "info")
     return redirect(request.referrer or url_for('index'))
@@ -539,23 +877,47 @@ app.add_url_rule('/admin/cancel/<int:appointment_id>', 'admin_cancel_appointment
 app.add_url_rule('/doctor/cancel/<int:appointment_id>', 'doctor_cancel_appointment', shared_cancel_appointment, methods=['POST'])
 app.add_url_rule('/patient/cancel/<int:appointment_id>', 'patient_cancel_appointment', shared_cancel_appointment, methods=['POST'])
 
+def reschedule_to_slot(db, appt, slot):
+    """Claims ``slot``, releases the appointment's old slot and moves it, in one BEGIN IMMEDIATE transaction.
+
+    Returns False when the slot was already taken.
+    """
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        if db.execute(Q.CLAIM_SLOT, (appt["patient_id"], datetime.now().isoformat(), slot["id"])).rowcount == 0:
+            db.rollback()
+            return False
+        db.execute(Q.RELEASE_SLOT, (appt["doctor_id"], appt["date"], appt["time"]))
+        db.execute(Q.RESCHEDULE_APPOINTMENT,
+                   (slot["date"], slot["start_time"], slot["end_time"], to_ts(slot["date"], slot["start_time"]), to_ts(slot["date"], slot["end_time"]), appt["id"]))
+        db.commit()
+        return True
+    except Exception:
+        db.rollback()
+        raise
+
 @app.route("/patient/reschedule/<int:appointment_id>", methods=["GET", "POST"])
 @login_required(role="patient")
 def patient_request_reschedule(appointment_id):
     db = get_db()
-    appt = db.execute("SELECT * FROM appointments WHERE id=?", (appointment_id,)).fetchone()
+    appt = db.execute(Q.APPOINTMENT_BY_ID, (appointment_id,)).fetchone()
     if request.method == "POST":
-        new_id = request.form.get("requested_slot_id")
-        slot = db.execute("SELECT * FROM doctor_availability WHERE id=?", (new_id,)).fetchone()
-        db.execute("UPDATE doctor_availability SET is_booked=0 WHERE doctor_id=? AND date=? AND start_time=?", (appt["doctor_id"], appt["date"], appt["time"]))
-        db.execute("UPDATE appointments SET date=?, time=?, end_time=? WHERE id=?", (slot["date"], slot["start_time"], slot["end_time"], appointment_id))
-        db.execute("UPDATE doctor_availability SET is_booked=1 WHERE id=?", (new_id,))
-        db.commit()
+        slot = db.execute(Q.SLOT_BY_ID, (request.form.get("requested_slot_id"),)).fetchone()
+        if slot is None or slot["doctor_id"] != appt["doctor_id"]:
+            flash("Slot not found.", "warning")
+            return redirect(url_for("patient_request_reschedule", appointment_id=appointment_id))
+        try:
+            moved = reschedule_to_slot(db, appt, slot)
+        except sqlite3.Error:
+            flash("Reschedule failed.", "danger")
+            return redirect(url_for("patient_request_reschedule", appointment_id=appointment_id))
+        if not moved:
+            flash("Sorry, that slot has just been booked. Please choose another.", "warning")
+            return redirect(url_for("patient_request_reschedule", appointment_id=appointment_id))
         flash("Rescheduled.", "success")
         return redirect(url_for("patient_dashboard"))
-    slots = db.execute("SELECT * FROM doctor_availability WHERE doctor_id=? AND is_booked=0", (appt["doctor_id"],)).fetchall()
-    valid = [s for s in slots if datetime.strptime(f"{s['date']} {s['start_time']}", "%Y-%m-%d %H:%M") > datetime.now()]
-    return render_template("patient_request_reschedule.html", appt=appt, slots=valid)
+    slots, first, prev, next_from = open_slot_window(db, appt["doctor_id"])
+    return render_template("patient_request_reschedule.html", appt=appt, slots=slots, first=first, prev=prev, next_from=next_from)
 
 if __name__ == "__main__":
     with app.app_context():
@@ -0,0 +1,98 @@
+"""Hot/cold tiering: old finished appointments and their treatments move to an ATTACHed archive file.
+
+``archive`` moves Completed and Cancelled appointments that started before a
+cutoff, with their treatments, into ``archive.appointments`` /
+``archive.treatments`` in short batches, keeping their ids. The hot tables and
+every index the booking path touches then only hold recent history.
+
+Pages read the archive only when asked for history: ``attach`` attaches the
+file to that connection and creates the temp view ``appointment_history``: the
+UNION ALL of hot and archived appointments, each tier joined to its own
+treatments (the two always move together) so a patient filter reaches both
+tiers' indexes.
+
+The archive is a separate file, so a batch is atomic within each file but not
+across both; after a crash the next run finishes the move (the archive insert
+is OR REPLACE on the kept ids). Archived rows keep the names copied onto them
+when they were archived. Each batch records its (doctor, patient) pairs in
+main's ``archived_visits`` (migration 15) first, so the doctor_patients
+counter and DOCTOR_PATIENTS keep counting archived patients.
+"""
+import json
+import os
+from urllib.parse import quote
+
+import queries as Q
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS archive.appointments (
+      id INTEGER PRIMARY KEY, patient_id INTEGER NOT NULL, doctor_id INTEGER NOT NULL,
+      date TEXT NOT NULL, time TEXT NOT NULL, end_time TEXT, status TEXT NOT NULL, created_at TEXT NOT NULL,
+      start_ts INTEGER, end_ts INTEGER, patient_name TEXT, patient_phone TEXT, doctor_name TEXT, department TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_appt_patient_ts ON appointments(patient_id, start_ts)",
+    """CREATE TABLE IF NOT EXISTS archive.treatments (
+      id INTEGER PRIMARY KEY, appointment_id INTEGER UNIQUE NOT NULL, diagnosis TEXT, prescription TEXT, notes TEXT
+    )""",
+]
+
+_tier = ("SELECT " + ", ".join(f"a.{c}" for c in Q.ARCHIVE_APPOINTMENT_COLUMNS) + ", t.diagnosis, t.prescription, t.notes"
+         " FROM {db}.appointments a LEFT JOIN {db}.treatments t ON t.appointment_id=a.id")
+VIEW = ("CREATE TEMP VIEW IF NOT EXISTS appointment_history AS "
+        + _tier.format(db="main") + " UNION ALL " + _tier.format(db="archive"))
+
+# One batch of ids through queries.py's archive statements, copies before deletes. Recording
+# the visits first keeps the counter triggers from treating the deletes as lost patients.
+MOVE = [Q.ARCHIVE_RECORD_VISITS, Q.ARCHIVE_COPY_APPOINTMENTS, Q.ARCHIVE_COPY_TREATMENTS, Q.ARCHIVE_DELETE_TREATMENTS, Q.ARCHIVE_DELETE_APPOINTMENTS]
+
+
+def attached(db):
+    return any(row[1] == "archive" for row in db.execute("PRAGMA database_list"))
+
+
+def attach(db, path):
+    """Attaches the archive at ``path`` with the history view; returns False if there is nothing to attach.
+
+    Read-only (query_only) connections attach it ``mode=ro`` and only once
+    the file exists; the writer creates it and its tables.
+    """
+    if attached(db):
+        return True
+    readonly = db.execute("PRAGMA query_only").fetchone()[0]
+    if readonly and not os.path.exists(path):
+        return False
+    target = f"file:{quote(os.path.abspath(path))}?mode=ro" if readonly else path
+    db.execute("ATTACH DATABASE ? AS archive", (target,))
+    if not readonly:
+        for statement in SCHEMA:
+            db.execute(statement)
+    # query_only also blocks the temp schema; the main and archive files stay mode=ro.
+    db.execute("PRAGMA query_only=0")
+    try:
+        db.execute(VIEW)
+    finally:
+        db.execute(f"PRAGMA query_only={readonly}")
+    return True
+
+
+def archive(db, path, before, batch=500):
+    """Moves finished appointments starting before ``before`` into the archive; returns ``(appointments, batches)``."""
+    attach(db, path)
+    moved = batches = 0
+    after = (-1 << 62, 0)
+    while True:
+        rows = db.execute(Q.ARCHIVABLE_IDS, (before,) + after + (batch,)).fetchall()
+        if not rows:
+            return moved, batches
+        ids = json.dumps([row[0] for row in rows])
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in MOVE:
+                db.execute(statement, (ids,))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        after = (rows[-1][1], rows[-1][0])
+        moved += len(rows)
+        batches += 1
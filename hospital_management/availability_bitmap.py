@@ -0,0 +1,137 @@
+"""Bitmap availability: one row per doctor-day holding open and booked masks of 5-minute cells.
+
+An alternative to the row-per-slot doctor_availability table. Cell ``i``
+covers DAY_START + 5*i minutes, so the 09:00-21:00 day offered by
+generate_time_slots() is 144 cells and each mask is 18 bytes. Opening,
+booking and cancelling are bit operations on those masks; free-slot search
+scans ``open & ~booked``.
+
+The table is opt-in (``install``); the app's routes still use
+doctor_availability.
+"""
+
+CELL_MINUTES = 5
+DAY_START = 9 * 60
+DAY_END = 21 * 60
+CELLS = (DAY_END - DAY_START) // CELL_MINUTES
+MASK_BYTES = (CELLS + 7) // 8
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS availability_masks (
+  doctor_id INTEGER NOT NULL, date TEXT NOT NULL,
+  open_mask BLOB NOT NULL, booked_mask BLOB NOT NULL,
+  PRIMARY KEY (doctor_id, date)
+) WITHOUT ROWID"""
+
+MASKS_FOR_DAY = "SELECT open_mask, booked_mask FROM availability_masks WHERE doctor_id=? AND date=?"
+MASKS_FOR_RANGE = "SELECT date, open_mask, booked_mask FROM availability_masks WHERE doctor_id=? AND date >= ? AND date <= ? ORDER BY date"
+INSERT_DAY = "INSERT OR IGNORE INTO availability_masks (doctor_id, date, open_mask, booked_mask) VALUES (?,?,?,?)"
+# Compare-and-swap on one mask: a rowcount of 0 means another connection changed it first.
+# Only book() and cancel() write booked_mask; opening and closing write open_mask alone.
+SWAP_BOOKED = "UPDATE availability_masks SET booked_mask=? WHERE doctor_id=? AND date=? AND booked_mask=?"
+SWAP_OPEN = "UPDATE availability_masks SET open_mask=? WHERE doctor_id=? AND date=? AND open_mask=?"
+# Sets open_mask to the booked mask as read, only if no booking has moved it since.
+CLOSE_UNBOOKED = "UPDATE availability_masks SET open_mask=? WHERE doctor_id=? AND date=? AND booked_mask=?"
+
+
+def install(db):
+    db.execute(SCHEMA)
+
+
+def cell(hm):
+    """Cell index of an HH:MM time on the 5-minute grid."""
+    h, m = map(int, hm.split(":"))
+    minutes = h * 60 + m
+    if minutes % CELL_MINUTES or not DAY_START <= minutes <= DAY_END:
+        raise ValueError(f"{hm} is not a {CELL_MINUTES}-minute boundary between 09:00 and 21:00")
+    return (minutes - DAY_START) // CELL_MINUTES
+
+
+def hm(index):
+    minutes = DAY_START + index * CELL_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+_HM = [hm(i) for i in range(CELLS + 1)]
+
+
+def span(start, end):
+    """Mask with the cells from ``start`` up to (not including) ``end`` set."""
+    lo, hi = cell(start), cell(end)
+    return ((1 << (hi - lo)) - 1) << lo if hi > lo else 0
+
+
+def to_blob(mask):
+    return mask.to_bytes(MASK_BYTES, "little")
+
+
+def from_blob(blob):
+    return int.from_bytes(blob, "little")
+
+
+def _masks(db, doctor_id, day):
+    row = db.execute(MASKS_FOR_DAY, (doctor_id, day)).fetchone()
+    return (from_blob(row[0]), from_blob(row[1])) if row else (0, 0)
+
+
+def open_range(db, doctor_id, day, start, end):
+    """Marks ``start``-``end`` open on ``day``; booked_mask is left alone (the caller commits)."""
+    empty = to_blob(0)
+    db.execute(INSERT_DAY, (doctor_id, day, empty, empty))
+    while True:
+        open_mask, _ = _masks(db, doctor_id, day)
+        if db.execute(SWAP_OPEN, (to_blob(open_mask | span(start, end)), doctor_id, day, to_blob(open_mask))).rowcount:
+            return
+
+
+def clear_open(db, doctor_id, day):
+    """Closes every unbooked cell on ``day``, like DELETE_OPEN_SLOTS_FOR_DAY (the caller commits)."""
+    while True:
+        row = db.execute(MASKS_FOR_DAY, (doctor_id, day)).fetchone()
+        if row is None or db.execute(CLOSE_UNBOOKED, (row[1], doctor_id, day, row[1])).rowcount:
+            return
+
+
+def book(db, doctor_id, day, start, end):
+    """Claims ``start``-``end`` if every cell is open and unbooked; returns whether it did.
+
+    Uses compare-and-swap on booked_mask, retrying only when a concurrent
+    change elsewhere on the same day moved the mask without touching these cells.
+    """
+    want = span(start, end)
+    while True:
+        open_mask, booked = _masks(db, doctor_id, day)
+        if not want or open_mask & want != want or booked & want:
+            return False
+        if db.execute(SWAP_BOOKED, (to_blob(booked | want), doctor_id, day, to_blob(booked))).rowcount:
+            return True
+
+
+def cancel(db, doctor_id, day, start, end):
+    """Releases ``start``-``end``; returns False if those cells were not all booked."""
+    want = span(start, end)
+    while True:
+        _, booked = _masks(db, doctor_id, day)
+        if booked & want != want:
+            return False
+        if db.execute(SWAP_BOOKED, (to_blob(booked & ~want), doctor_id, day, to_blob(booked))).rowcount:
+            return True
+
+
+def free_slots_in(open_mask, booked, length=15):
+    """(start, end) HH:MM pairs of back-to-back ``length``-minute free slots, packed from the start of each free run."""
+    k = length // CELL_MINUTES
+    free = open_mask & ~booked
+    slots = []
+    while free:
+        start = (free & -free).bit_length() - 1
+        run = free >> start
+        width = (run ^ (run + 1)).bit_length() - 1
+        slots += [(_HM[i], _HM[i + k]) for i in range(start, start + width - k + 1, k)]
+        free &= ~(((1 << width) - 1) << start)
+    return slots
+
+
+def free_slots(db, doctor_id, first_day, last_day, length=15):
+    """``{date: [(start, end), ...]}`` of free slots for a doctor over a date range."""
+    rows = db.execute(MASKS_FOR_RANGE, (doctor_id, first_day, last_day))
+    return {day: free_slots_in(from_blob(o), from_blob(b), length) for day, o, b in rows}
@@ -0,0 +1,145 @@
+"""Online snapshots of the live database with the sqlite3 backup API.
+
+``snapshot`` copies the database from its own read-only connection in steps
+of ``pages`` pages, sleeping between steps, into ``<dir>/hospital-<stamp>.db``
+and writes a ``.sha256`` sidecar once the copy passes ``PRAGMA
+quick_check``. Under WAL the copy never blocks writers, but a write from
+another connection restarts a stepped backup. Each restart starts the copy
+over with four times the pages per step and half the sleep, so a pass needs
+fewer, shorter gaps between steps to get through; only after ``max_restarts``
+of those is the copy finished in one step, reading from a single WAL
+snapshot for the whole copy, which is logged as a warning.
+
+``rotate`` keeps the newest snapshots, ``verify`` rechecks a snapshot against
+its sidecar, and ``restore`` copies a verified snapshot back over a database.
+The archive database (archive.py) is not part of the snapshot.
+"""
+import glob
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from datetime import datetime
+from urllib.parse import quote
+
+PREFIX = "hospital-"
+
+# ``pages`` is the step size of the pass that finished the copy, -1 when it was finished in one step.
+Snapshot = namedtuple("Snapshot", "path size sha256 seconds restarts pages")
+
+logger = logging.getLogger("hospital.backup")
+
+
+class BackupError(Exception):
+    """Raised when a snapshot is missing, fails its checksum or is corrupt."""
+
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshots(directory):
+    """Snapshot paths in ``directory``, oldest first."""
+    return sorted(glob.glob(os.path.join(directory, f"{PREFIX}*.db")))
+
+
+class _Restart(Exception):
+    """Raised from the progress callback to abandon a stepped pass that has restarted."""
+
+
+def snapshot(path, directory, pages=256, sleep=0.01, max_restarts=3):
+    """Copies the database at ``path`` into a new snapshot in ``directory``."""
+    os.makedirs(directory, exist_ok=True)
+    dest = os.path.join(directory, f"{PREFIX}{datetime.now():%Y%m%d-%H%M%S-%f}.db")
+    partial = dest + ".part"
+    state = {"left": None}
+
+    def progress(status, remaining, total):
+        if state["left"] is not None and remaining > state["left"]:
+            raise _Restart
+        state["left"] = remaining
+
+    started = time.perf_counter()
+    source = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+    target = sqlite3.connect(partial)
+    restarts = 0
+    try:
+        while True:
+            state["left"] = None
+            try:
+                source.backup(target, pages=pages, sleep=sleep, progress=progress)
+                break
+            except _Restart:
+                restarts += 1
+            if restarts > max_restarts:
+                logger.warning("snapshot of %s restarted %d times under writes, last at %d pages per step;"
+                               " finishing it in one step", path, restarts, pages)
+                source.backup(target)
+                pages = -1
+                break
+            pages, sleep = pages * 4, sleep / 2
+        if target.execute("PRAGMA quick_check").fetchone()[0] != "ok":
+            raise BackupError(f"snapshot of {path} failed quick_check")
+        target.execute("PRAGMA journal_mode=DELETE")
+    except BaseException:
+        target.close()
+        os.remove(partial)
+        raise
+    finally:
+        source.close()
+    target.close()
+    os.replace(partial, dest)
+    digest = sha256(dest)
+    with open(dest + ".sha256", "w") as f:
+        f.write(f"{digest}  {os.path.basename(dest)}\n")
+    return Snapshot(dest, os.path.getsize(dest), digest, time.perf_counter() - started, restarts, pages)
+
+
+def verify(path):
+    """Raises BackupError unless ``path`` matches its .sha256 sidecar and passes quick_check."""
+    try:
+        with open(path + ".sha256") as f:
+            expected = f.read().split()[0]
+    except (OSError, IndexError):
+        raise BackupError(f"{path} has no checksum file")
+    if sha256(path) != expected:
+        raise BackupError(f"{path} does not match its checksum")
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+    try:
+        if conn.execute("PRAGMA quick_check").fetchone()[0] != "ok":
+            raise BackupError(f"{path} failed quick_check")
+    finally:
+        conn.close()
+
+
+def rotate(directory, keep):
+    """Deletes all but the newest ``keep`` snapshots and their sidecars; returns the deleted paths."""
+    expired = snapshots(directory)[:-keep] if keep > 0 else []
+    for path in expired:
+        for name in (path, path + ".sha256"):
+            if os.path.exists(name):
+                os.remove(name)
+    return expired
+
+
+def restore(snapshot_path, path):
+    """Verifies ``snapshot_path`` and copies it over the database at ``path``.
+
+    The copy goes through the backup API into a connection on the live file,
+    so it takes the write lock and other connections see the restored content
+    on their next read; stop the app first to avoid losing in-flight writes.
+    """
+    verify(snapshot_path)
+    source = sqlite3.connect(f"file:{quote(os.path.abspath(snapshot_path))}?mode=ro", uri=True)
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
@@ -0,0 +1,541 @@
+"""Micro-benchmarks for the hospital database layer.
+
+Each benchmark builds a throwaway database with the app's own schema, so run
+them from this directory:
+
+    python bench.py profiles --seconds 5 --readers 4
+    python bench.py search --doctors 10000
+    python bench.py booking --procs 8 --slots 500
+    python bench.py slots --days 90 --length 5
+    python bench.py bitmap --doctors 5000 --days 90
+    python bench.py earliest --doctors 500 --days 30
+    python bench.py backup --size-mb 1024
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import availability_bitmap as bitmap
+import backup
+import queries as Q
+from app import app, book_slot, earliest_slots, get_db, init_db, slot_rows
+from db import ConnectionPool, PRAGMA_PROFILES
+from schema import to_ts
+from search import search_doctor_ids
+
+FIRST_NAMES = ["Arima", "Naman", "Vina", "Mehak", "Prachi", "Varun", "Shasvat", "Priya", "Parth", "Aadhya", "Rohan", "Kavya"]
+LAST_NAMES = ["Jain", "Yadav", "Mehta", "Awasthi", "Desai", "Singh", "Sharma", "Soni", "Kapoor", "Iyer", "Reddy", "Das"]
+SPECIALTIES = ["Cardiology", "Neurology", "Dermatology", "Dentistry", "Psychiatry", "Oncology", "Pediatrics", "Orthopedics"]
+
+
+def fresh_db(workdir, name="bench.db"):
+    """Creates an empty database with the app schema and returns its path."""
+    path = os.path.join(workdir, name)
+    app.config["DATABASE"] = path
+    app.extensions.pop("db_pools", None)
+    with app.app_context():
+        init_db()
+    for pool in app.extensions.pop("db_pools").values():
+        pool.close()
+    return path
+
+
+def seed_slots(conn, doctors=200, days=14, per_day=24):
+    """Inserts doctors, one patient and an open slot grid for each doctor."""
+    today = date.today()
+    for i in range(doctors):
+        cur = conn.execute("INSERT INTO users (username,password_hash,role,full_name) VALUES (?,?,?,?)",
+                           (f"doc{i}", "x", "doctor", f"Doctor {i}"))
+        conn.execute("INSERT INTO doctors (user_id) VALUES (?)", (cur.lastrowid,))
+    cur = conn.execute("INSERT INTO users (username,password_hash,role,full_name) VALUES (?,?,?,?)",
+                       ("pat", "x", "patient", "Patient"))
+    conn.execute("INSERT INTO patients (user_id) VALUES (?)", (cur.lastrowid,))
+    rows = []
+    for doc in range(1, doctors + 1):
+        for d in range(1, days + 1):
+            iso = (today + timedelta(days=d)).isoformat()
+            midnight = to_ts(iso, "00:00")
+            for s in range(per_day):
+                m = 9 * 60 + s * 15
+                rows.append((doc, iso, f"{m // 60:02d}:{m % 60:02d}", f"{(m + 15) // 60:02d}:{(m + 15) % 60:02d}", midnight + m * 60))
+    conn.executemany("INSERT INTO doctor_availability (doctor_id,date,start_time,end_time,start_ts,is_booked) VALUES (?,?,?,?,?,0)", rows)
+    conn.commit()
+    return doctors
+
+
+def bench_profiles(args):
+    """Concurrent slot-listing reads against a booking writer, per PRAGMA profile."""
+    print(f"{'profile':<12}{'reads/s':>12}{'writes/s':>12}{'errors':>8}")
+    for profile in PRAGMA_PROFILES:
+        workdir = tempfile.mkdtemp()
+        try:
+            path = fresh_db(workdir)
+            writers = ConnectionPool(path, size=1, warm=0, profile=profile)
+            readers = ConnectionPool(path, size=args.readers, warm=0, profile=profile, readonly=True)
+            conn = writers.acquire()
+            doctors = seed_slots(conn)
+            writers.release(conn)
+
+            stop = threading.Event()
+            counts = {"reads": 0, "writes": 0, "errors": 0}
+            lock = threading.Lock()
+
+            def reader():
+                conn, n = readers.acquire(), 0
+                while not stop.is_set():
+                    conn.execute("SELECT * FROM doctor_availability WHERE doctor_id=? AND is_booked=0 ORDER BY date, start_time",
+                                 (random.randint(1, doctors),)).fetchall()
+                    n += 1
+                readers.release(conn)
+                with lock:
+                    counts["reads"] += n
+
+            def writer():
+                conn, n, errors = writers.acquire(), 0, 0
+                while not stop.is_set():
+                    slot = conn.execute("SELECT * FROM doctor_availability WHERE is_booked=0 LIMIT 1").fetchone()
+                    try:
+                        conn.execute("INSERT INTO appointments (patient_id, doctor_id, date, time, end_time, status, created_at) VALUES (?,?,?,?,?,?,?)",
+                                     (1, slot["doctor_id"], slot["date"], slot["start_time"], slot["end_time"], "Booked", "bench"))
+                        conn.execute("UPDATE doctor_availability SET is_booked=1 WHERE id=?", (slot["id"],))
+                        conn.commit()
+                        n += 1
+                    except Exception:
+                        conn.rollback()
+                        errors += 1
+                writers.release(conn)
+                with lock:
+                    counts["writes"] += n
+                    counts["errors"] += errors
+
+            threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+            threads.append(threading.Thread(target=writer))
+            for t in threads:
+                t.start()
+            time.sleep(args.seconds)
+            stop.set()
+            for t in threads:
+                t.join()
+            readers.close()
+            writers.close()
+            print(f"{profile:<12}{counts['reads'] / args.seconds:>12.0f}{counts['writes'] / args.seconds:>12.0f}{counts['errors']:>8}")
+        finally:
+            shutil.rmtree(workdir)
+
+
+def seed_directory(conn, doctors, rng):
+    """Inserts ``doctors`` doctors spread over SPECIALTIES, with names, emails and short bios."""
+    dept_ids = [conn.execute("INSERT INTO departments (name) VALUES (?)", (name,)).lastrowid for name in SPECIALTIES]
+    for i in range(doctors):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        dept = rng.randrange(len(SPECIALTIES))
+        cur = conn.execute("INSERT INTO users (username,password_hash,role,full_name,email) VALUES (?,?,?,?,?)",
+                           (f"{first.lower()}{i}", "x", "doctor", f"Dr. {first} {last}", f"{first.lower()}.{last.lower()}{i}@example.com"))
+        conn.execute("INSERT INTO doctors (user_id, department_id, experience, bio) VALUES (?,?,?,?)",
+                     (cur.lastrowid, dept_ids[dept], f"{rng.randint(1, 30)} years",
+                      f"{SPECIALTIES[dept]} consultant with an interest in {rng.choice(SPECIALTIES).lower()}."))
+    conn.commit()
+
+
+# The pre-FTS manage_doctors search, kept for comparison.
+LIKE_SEARCH = """SELECT d.id FROM doctors d JOIN users u ON d.user_id=u.id LEFT JOIN departments dep ON d.department_id=dep.id
+  WHERE u.full_name LIKE ? OR u.username LIKE ? OR u.email LIKE ? OR dep.name LIKE ? ORDER BY u.full_name LIMIT ?"""
+
+
+def bench_search(args):
+    """Doctor search: leading-wildcard LIKE over the join versus the FTS5 index, first page of results."""
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp()
+    try:
+        path = fresh_db(workdir)
+        pool = ConnectionPool(path, size=1, warm=0)
+        conn = pool.acquire()
+        seed_directory(conn, args.doctors, rng)
+        terms = [w[:n] for w in FIRST_NAMES + LAST_NAMES + SPECIALTIES for n in (2, 4)] + ["mehta card", "neuro"]
+        print(f"{args.doctors} doctors, {len(terms)} queries x {args.repeat}")
+        print(f"{'method':<8}{'ms/query':>12}")
+        for label, run in (
+            ("like", lambda t: conn.execute(LIKE_SEARCH, (f"%{t}%",) * 4 + (args.page_size,)).fetchall()),
+            ("fts5", lambda t: search_doctor_ids(conn, t, 1, args.page_size)),
+        ):
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                for term in terms:
+                    run(term)
+            elapsed = time.perf_counter() - started
+            print(f"{label:<8}{elapsed * 1000 / (args.repeat * len(terms)):>12.3f}")
+        pool.release(conn)
+        pool.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+def _booking_worker(path, patient_id, slot_ids, seed, go, results):
+    app.config["DATABASE"] = path
+    app.extensions.pop("db_pools", None)
+    random.Random(seed).shuffle(slot_ids)
+    booked = taken = errors = 0
+    with app.app_context():
+        db = get_db()
+        go.wait()
+        for slot_id in slot_ids:
+            slot = db.execute(Q.SLOT_BY_ID, (slot_id,)).fetchone()
+            try:
+                if book_slot(db, slot, patient_id) is None:
+                    taken += 1
+                else:
+                    booked += 1
+            except Exception:
+                errors += 1
+    results.put((booked, taken, errors))
+
+
+def bench_booking(args):
+    """Processes racing to book the same slots through app.book_slot; fails on any double booking."""
+    workdir = tempfile.mkdtemp()
+    try:
+        path = fresh_db(workdir)
+        pool = ConnectionPool(path, size=1, warm=0)
+        conn = pool.acquire()
+        seed_slots(conn, doctors=max(1, args.slots // 24), days=1, per_day=min(args.slots, 24))
+        patients = [conn.execute("INSERT INTO patients (user_id) VALUES (?)",
+                                 (conn.execute("INSERT INTO users (username,password_hash,role) VALUES (?,?,?)",
+                                               (f"racer{i}", "x", "patient")).lastrowid,)).lastrowid
+                    for i in range(args.procs)]
+        conn.commit()
+        slot_ids = [row[0] for row in conn.execute("SELECT id FROM doctor_availability")]
+        pool.release(conn)
+
+        ctx = multiprocessing.get_context("fork")
+        go, results = ctx.Event(), ctx.Queue()
+        procs = [ctx.Process(target=_booking_worker, args=(path, patient, list(slot_ids), i, go, results))
+                 for i, patient in enumerate(patients)]
+        for p in procs:
+            p.start()
+        started = time.perf_counter()
+        go.set()
+        totals = [sum(col) for col in zip(*(results.get() for _ in procs))]
+        elapsed = time.perf_counter() - started
+        for p in procs:
+            p.join()
+
+        conn = pool.acquire()
+        doubled = conn.execute("""SELECT COUNT(*) FROM (SELECT 1 FROM appointments WHERE status='Booked'
+                                  GROUP BY doctor_id, start_ts HAVING COUNT(*) > 1)""").fetchone()[0]
+        appts = conn.execute("SELECT COUNT(*) FROM appointments").fetchone()[0]
+        claimed = conn.execute("SELECT COUNT(*) FROM doctor_availability WHERE is_booked=1").fetchone()[0]
+        pool.release(conn)
+        pool.close()
+        booked, taken, errors = totals
+        print(f"{args.procs} processes x {len(slot_ids)} slots in {elapsed:.2f}s")
+        print(f"booked {booked} ({booked / elapsed:.0f}/s), lost races {taken}, errors {errors}")
+        print(f"appointments {appts}, claimed slots {claimed}, double-booked {doubled}")
+        if doubled or booked != len(slot_ids) or appts != booked or claimed != booked:
+            raise SystemExit("booking invariant violated")
+    finally:
+        shutil.rmtree(workdir)
+
+
+def bench_slots(args):
+    """Slot generation over a long horizon: one execute per slot versus one executemany per doctor.
+
+    Slot rows are built before the clock starts, so only the database writes are
+    timed. The two methods alternate which goes first and each keeps its best of
+    ``--repeat`` rounds, so neither benefits from the other warming the file.
+    """
+    workdir = tempfile.mkdtemp()
+    try:
+        path = fresh_db(workdir)
+        pool = ConnectionPool(path, size=1, warm=0)
+        conn = pool.acquire()
+        seed_slots(conn, doctors=args.doctors, days=0)
+        today = date.today()
+        days = [(today + timedelta(days=d)).isoformat() for d in range(args.days)]
+        plan = {doc: [(iso, slot_rows(doc, iso, args.start, args.end, args.length)) for iso in days]
+                for doc in range(1, args.doctors + 1)}
+
+        def per_slot(doc):
+            for iso, rows in plan[doc]:
+                conn.execute(Q.DELETE_OPEN_SLOTS_FOR_DAY, (doc, iso))
+                for row in rows:
+                    conn.execute(Q.INSERT_SLOT, row)
+
+        def batched(doc):
+            conn.executemany(Q.DELETE_OPEN_SLOTS_FOR_DAY, [(doc, iso) for iso, _ in plan[doc]])
+            conn.executemany(Q.INSERT_SLOT, [row for _, rows in plan[doc] for row in rows])
+
+        def run(submit):
+            conn.execute("DELETE FROM doctor_availability")
+            conn.commit()
+            started = time.perf_counter()
+            for doc in plan:
+                submit(doc)
+                conn.commit()
+            return (time.perf_counter() - started) * 1000 / args.doctors
+
+        methods = {"per-slot": per_slot, "executemany": batched}
+        best = dict.fromkeys(methods, float("inf"))
+        for i in range(args.repeat):
+            for label in (list(methods) if i % 2 == 0 else list(reversed(methods))):
+                best[label] = min(best[label], run(methods[label]))
+        slots = conn.execute("SELECT COUNT(*) FROM doctor_availability").fetchone()[0]
+
+        print(f"{args.doctors} doctors x {args.days} days of {args.length}-minute slots, {args.start}-{args.end}, "
+              f"best of {args.repeat}")
+        print(f"{'method':<14}{'slots':>10}{'ms/doctor':>12}")
+        for label, ms in best.items():
+            print(f"{label:<14}{slots:>10}{ms:>12.1f}")
+        print(f"executemany saves {1 - best['executemany'] / best['per-slot']:.0%} of write time")
+        pool.release(conn)
+        pool.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+def bench_bitmap(args):
+    """Row-per-slot availability versus bitmap masks: DB size, memory per horizon and free-slot latency."""
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp()
+    try:
+        rows_path = fresh_db(workdir, "rows.db")
+        masks_path = os.path.join(workdir, "masks.db")
+        rows_db = sqlite3.connect(rows_path)
+        masks_db = sqlite3.connect(masks_path)
+        masks_db.execute("PRAGMA journal_mode=WAL")
+        bitmap.install(masks_db)
+        today = date.today()
+        days = [(today + timedelta(days=d)).isoformat() for d in range(args.days)]
+        cells = [(bitmap.hm(i), bitmap.hm(i + 1)) for i in range(bitmap.CELLS)]
+        full = (1 << bitmap.CELLS) - 1
+
+        for doc in range(1, args.doctors + 1):
+            slot_rows, mask_rows = [], []
+            for iso in days:
+                booked = 0
+                first = to_ts(iso, bitmap.hm(0))
+                for i, (start, end) in enumerate(cells):
+                    is_booked = rng.random() < args.booked
+                    booked |= is_booked << i
+                    slot_rows.append((doc, iso, start, end, first + i * bitmap.CELL_MINUTES * 60, int(is_booked)))
+                mask_rows.append((doc, iso, bitmap.to_blob(full), bitmap.to_blob(booked)))
+            rows_db.executemany("INSERT INTO doctor_availability (doctor_id,date,start_time,end_time,start_ts,is_booked) VALUES (?,?,?,?,?,?)", slot_rows)
+            masks_db.executemany(bitmap.INSERT_DAY, mask_rows)
+            rows_db.commit()
+            masks_db.commit()
+
+        def size_mb(conn, path):
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            return os.path.getsize(path) / 2 ** 20
+
+        def peak_kb(fetch):
+            tracemalloc.start()
+            for doc in probe_docs:
+                fetch(doc)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak / 1024
+
+        def ms_per(fetch, probes):
+            started = time.perf_counter()
+            for probe in probes:
+                fetch(*probe)
+            return (time.perf_counter() - started) * 1000 / len(probes)
+
+        open_slots = "SELECT start_time, end_time FROM doctor_availability WHERE doctor_id=? AND date >= ? AND date <= ? AND is_booked=0 ORDER BY date, start_time"
+        horizon = "SELECT * FROM doctor_availability WHERE doctor_id=? AND date >= ? AND date <= ?"
+        probe_docs = [rng.randint(1, args.doctors) for _ in range(20)]
+        day_probes = [(rng.randint(1, args.doctors), rng.choice(days)) for _ in range(args.probes)]
+        week_probes = [(doc, days[i], days[min(i + 13, len(days) - 1)])
+                       for doc, i in ((rng.randint(1, args.doctors), rng.randrange(len(days))) for _ in range(args.probes))]
+
+        print(f"{args.doctors} doctors x {args.days} days, {bitmap.CELLS} five-minute cells/day, {args.booked:.0%} booked")
+        print(f"{'engine':<8}{'DB MB':>10}{'horizon KB':>12}{'day ms':>10}{'14-day ms':>11}")
+        print(f"{'rows':<8}{size_mb(rows_db, rows_path):>10.1f}"
+              f"{peak_kb(lambda doc: rows_db.execute(horizon, (doc, days[0], days[-1])).fetchall()):>12.1f}"
+              f"{ms_per(lambda doc, day: rows_db.execute(open_slots, (doc, day, day)).fetchall(), day_probes):>10.3f}"
+              f"{ms_per(lambda doc, lo, hi: rows_db.execute(open_slots, (doc, lo, hi)).fetchall(), week_probes):>11.3f}")
+        print(f"{'bitmap':<8}{size_mb(masks_db, masks_path):>10.1f}"
+              f"{peak_kb(lambda doc: masks_db.execute(bitmap.MASKS_FOR_RANGE, (doc, days[0], days[-1])).fetchall()):>12.1f}"
+              f"{ms_per(lambda doc, day: bitmap.free_slots(masks_db, doc, day, day, bitmap.CELL_MINUTES), day_probes):>10.3f}"
+              f"{ms_per(lambda doc, lo, hi: bitmap.free_slots(masks_db, doc, lo, hi, bitmap.CELL_MINUTES), week_probes):>11.3f}")
+        rows_db.close()
+        masks_db.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+def bench_earliest(args):
+    """Earliest open slots across one department: heap merge of per-doctor cursors, p50/p95 against a 20 ms target."""
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp()
+    try:
+        path = fresh_db(workdir)
+        pool = ConnectionPool(path, size=1, warm=0)
+        conn = pool.acquire()
+        dept = conn.execute("INSERT INTO departments (name) VALUES (?)", (SPECIALTIES[0],)).lastrowid
+        today = date.today()
+        for i in range(args.doctors):
+            cur = conn.execute("INSERT INTO users (username,password_hash,role,full_name) VALUES (?,?,?,?)",
+                               (f"doc{i}", "x", "doctor", f"Doctor {i}"))
+            doc = conn.execute("INSERT INTO doctors (user_id, department_id) VALUES (?,?)", (cur.lastrowid, dept)).lastrowid
+            rows = []
+            for d in range(args.days):
+                iso = (today + timedelta(days=d)).isoformat()
+                midnight = to_ts(iso, "00:00")
+                for s in range(args.per_day):
+                    m = 9 * 60 + s * 15
+                    rows.append((doc, iso, f"{m // 60:02d}:{m % 60:02d}", f"{(m + 15) // 60:02d}:{(m + 15) % 60:02d}",
+                                 midnight + m * 60, int(rng.random() < args.booked)))
+            conn.executemany("INSERT INTO doctor_availability (doctor_id,date,start_time,end_time,start_ts,is_booked) VALUES (?,?,?,?,?,?)", rows)
+        conn.commit()
+        conn.execute("ANALYZE")
+
+        start = to_ts(today.isoformat(), "00:00")
+        timings = []
+        for _ in range(args.probes):
+            lo = start + rng.randrange(args.days * 86400)
+            started = time.perf_counter()
+            ids = [row["id"] for row in conn.execute(Q.DEPARTMENT_ACTIVE_DOCTORS, (SPECIALTIES[0],))]
+            earliest_slots(conn, ids, lo, lo + 14 * 86400, args.n)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p50, p95 = timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+        print(f"{args.doctors} doctors x {args.days} days x {args.per_day} slots, {args.booked:.0%} booked, n={args.n}")
+        print(f"{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}  target 20 ms: {'ok' if p95 < 20 else 'MISSED'}")
+        print(f"{p50:>10.3f}{p95:>10.3f}{timings[-1]:>10.3f}")
+        pool.release(conn)
+        pool.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+def _percentiles(ms):
+    ms = sorted(ms) or [0.0]
+    return ms[len(ms) // 2], ms[int(len(ms) * 0.95)], ms[-1]
+
+
+def bench_backup(args):
+    """Online snapshot of a padded database: duration, throughput and booking latency with and without it running."""
+    workdir = tempfile.mkdtemp()
+    try:
+        path = fresh_db(workdir)
+        pool = ConnectionPool(path, size=1, warm=0)
+        conn = pool.acquire()
+        seed_slots(conn, doctors=50, days=30)
+        patient_id = conn.execute("SELECT id FROM patients").fetchone()[0]
+        conn.execute("CREATE TABLE bench_padding (data BLOB)")
+        while os.path.getsize(path) < args.size_mb * 2 ** 20:
+            conn.executemany("INSERT INTO bench_padding VALUES (?)", ((os.urandom(4000),) for _ in range(10000)))
+            conn.commit()
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        slots = iter(conn.execute("SELECT * FROM doctor_availability ORDER BY id").fetchall())
+
+        def book_while(running):
+            """Books one slot every few ms until ``running`` clears; returns per-booking latencies in ms."""
+            latencies = []
+            while running.is_set():
+                started = time.perf_counter()
+                book_slot(conn, next(slots), patient_id)
+                latencies.append((time.perf_counter() - started) * 1000)
+                time.sleep(0.005)
+            return latencies
+
+        running = threading.Event()
+        running.set()
+        threading.Timer(args.baseline, running.clear).start()
+        idle = book_while(running)
+
+        result = {}
+        running.set()
+
+        def take():
+            result["snap"] = backup.snapshot(path, os.path.join(workdir, "snapshots"), pages=args.pages, sleep=args.sleep)
+            running.clear()
+
+        snapper = threading.Thread(target=take)
+        snapper.start()
+        during = book_while(running)
+        snapper.join()
+        snap = result["snap"]
+        pool.release(conn)
+        pool.close()
+
+        print(f"{snap.size / 2 ** 20:.0f} MB snapshot in {snap.seconds:.2f} s ({snap.size / 2 ** 20 / snap.seconds:.0f} MB/s),"
+              f" {args.pages} pages/step, {args.sleep * 1000:.0f} ms sleep, {snap.restarts} restarts,"
+              f" finished at {'one step' if snap.pages < 0 else f'{snap.pages} pages/step'}")
+        print(f"{'bookings':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+        for label, ms in (("idle", idle), ("during backup", during)):
+            print(f"{label:<16}{len(ms):>8}" + "".join(f"{v:>10.3f}" for v in _percentiles(ms)))
+    finally:
+        shutil.rmtree(workdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("profiles", help=bench_profiles.__doc__)
+    p.add_argument("--seconds", type=float, default=5)
+    p.add_argument("--readers", type=int, default=4)
+    p.set_defaults(func=bench_profiles)
+
+    p = sub.add_parser("search", help=bench_search.__doc__)
+    p.add_argument("--doctors", type=int, default=10000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--page-size", type=int, default=20)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_search)
+
+    p = sub.add_parser("booking", help=bench_booking.__doc__)
+    p.add_argument("--procs", type=int, default=8)
+    p.add_argument("--slots", type=int, default=500)
+    p.set_defaults(func=bench_booking)
+
+    p = sub.add_parser("slots", help=bench_slots.__doc__)
+    p.add_argument("--doctors", type=int, default=10)
+    p.add_argument("--days", type=int, default=90)
+    p.add_argument("--length", type=int, default=5)
+    p.add_argument("--start", default="09:00")
+    p.add_argument("--end", default="21:00")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_slots)
+
+    p = sub.add_parser("bitmap", help=bench_bitmap.__doc__)
+    p.add_argument("--doctors", type=int, default=5000)
+    p.add_argument("--days", type=int, default=90)
+    p.add_argument("--booked", type=float, default=0.1)
+    p.add_argument("--probes", type=int, default=500)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_bitmap)
+
+    p = sub.add_parser("earliest", help=bench_earliest.__doc__)
+    p.add_argument("--doctors", type=int, default=500)
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--per-day", type=int, default=24)
+    p.add_argument("--booked", type=float, default=0.5)
+    p.add_argument("-n", type=int, default=10)
+    p.add_argument("--probes", type=int, default=200)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_earliest)
+
+    p = sub.add_parser("backup", help=bench_backup.__doc__)
+    p.add_argument("--size-mb", type=int, default=1024)
+    p.add_argument("--pages", type=int, default=256)
+    p.add_argument("--sleep", type=float, default=0.01)
+    p.add_argument("--baseline", type=float, default=3.0)
+    p.set_defaults(func=bench_backup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""In-process cache of the doctor directory (doctors joined to users and departments).
+
+The directory changes a few times a day but is read by most patient pages and
+the admin doctor list. Triggers from migration 8 bump a version counter on
+every write that can change it, so each read costs one primary-key lookup and
+every worker process picks a change up on its next request.
+"""
+import threading
+from collections import namedtuple
+
+import queries as Q
+
+Directory = namedtuple("Directory", "version doctors by_id strip")
+
+STRIP_SIZE = 4
+
+
+class DoctorDirectory:
+    """Holds the latest directory snapshot and reloads it when the version moves."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = Directory(None, (), {}, ())
+        self.hits = 0
+        self.refreshes = 0
+
+    def get(self, db):
+        """Returns a current Directory, reloading it through ``db`` if it is stale."""
+        version = db.execute(Q.DIRECTORY_VERSION).fetchone()["c"]
+        snapshot = self._snapshot
+        if snapshot.version == version:
+            self.hits += 1
+            return snapshot
+        with self._lock:
+            if self._snapshot.version != version:
+                # Read after the version, so the rows are never older than the stamp they are cached under.
+                doctors = tuple(db.execute(Q.DOCTOR_DIRECTORY).fetchall())
+                strip = tuple(sorted(doctors, key=lambda d: d["id"])[:STRIP_SIZE])
+                self._snapshot = Directory(version, doctors, {d["id"]: d for d in doctors}, strip)
+                self.refreshes += 1
+            return self._snapshot
+
+    def stats(self):
+        return {"version": self._snapshot.version, "doctors": len(self._snapshot.doctors),
+                "hits": self.hits, "refreshes": self.refreshes}
@@ -0,0 +1,93 @@
+"""Compaction of expired open slots in doctor_availability.
+
+Saving availability only regenerates future days, so unbooked slots from past
+days pile up forever. ``compact`` deletes them in small batches, each in its
+own short BEGIN IMMEDIATE transaction with a pause after it, so bookings queue
+behind at most one batch. Booked rows are kept: appointments still point at
+them through RELEASE_SLOT. Expired open slots carry no patient data, so they
+are deleted rather than archived.
+
+Freed pages go back to the file only when the database uses
+``auto_vacuum=INCREMENTAL``, which the db.py profiles set on new databases;
+``enable_incremental_vacuum`` switches an existing file over once (a full
+VACUUM, so run it off-hours). Until then the report's ``vacuumed`` is False
+and the freed pages stay on the freelist for reuse.
+
+Every app process can run the background compactor, so each tick first
+``claim``s a lease row in ``counters``; only the process that wins it compacts,
+and it holds the lease for one interval past the end of its run.
+"""
+import time
+from collections import namedtuple
+
+import queries as Q
+
+Report = namedtuple("Report", "rows batches pages_before pages_after free_pages page_size seconds vacuumed")
+
+
+def pages(db):
+    """``(page_count, freelist_count, page_size)`` of the main database."""
+    return tuple(db.execute(f"PRAGMA {name}").fetchone()[0] for name in ("page_count", "freelist_count", "page_size"))
+
+
+def incremental(db):
+    return db.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def enable_incremental_vacuum(db):
+    db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    db.execute("VACUUM")
+
+
+def claim(db, interval, now=None):
+    """Takes the compaction lease for ``interval`` seconds if no other process holds it; returns whether it did."""
+    now = int(time.time() if now is None else now)
+    won = db.execute(Q.CLAIM_COMPACTION_LEASE, (now, now + int(interval))).rowcount > 0
+    db.commit()
+    return won
+
+
+def extend(db, interval):
+    """Keeps the lease until ``interval`` seconds from now, after a run that may have outlasted it."""
+    db.execute(Q.EXTEND_COMPACTION_LEASE, (int(time.time() + interval),))
+    db.commit()
+
+
+def delete_expired(db, before, batch=500, pause=0.05):
+    """Deletes open slots starting before ``before``; returns ``(rows, batches)``."""
+    rows = batches = 0
+    after = 0
+    while True:
+        ids = [row[0] for row in db.execute(Q.EXPIRED_SLOT_IDS, (after, before, batch))]
+        if not ids:
+            return rows, batches
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            rows += db.execute(Q.DELETE_EXPIRED_SLOTS, (ids[0], ids[-1], before)).rowcount
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        after = ids[-1]
+        batches += 1
+        time.sleep(pause)
+
+
+def vacuum(db, step=200, pause=0.05):
+    """Returns free pages to the filesystem ``step`` pages per write; returns False when auto_vacuum is not incremental."""
+    if not incremental(db):
+        return False
+    while db.execute("PRAGMA freelist_count").fetchone()[0]:
+        db.execute(f"PRAGMA incremental_vacuum({int(step)})").fetchall()
+        time.sleep(pause)
+    return True
+
+
+def compact(db, before, batch=500, pause=0.05, vacuum_step=200):
+    """Deletes expired open slots, then vacuums incrementally, and reports what it reclaimed."""
+    started = time.perf_counter()
+    pages_before, _, page_size = pages(db)
+    rows, batches = delete_expired(db, before, batch, pause)
+    vacuumed = vacuum(db, vacuum_step, pause)
+    pages_after, free_pages, _ = pages(db)
+    return Report(rows, batches, pages_before, pages_after, free_pages, page_size, time.perf_counter() - started, vacuumed)
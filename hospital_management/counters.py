@@ -0,0 +1,60 @@
+"""Trigger-maintained counters behind the dashboard KPIs and department doctor counts.
+
+Each counter is a ``(scope, key)`` row in the ``counters`` table, kept exact by
+the triggers from migration 7, so the pages read it with a primary-key lookup
+instead of a COUNT. ``reconcile`` recomputes every counter from the base tables
+to catch (and optionally repair) any drift.
+"""
+
+# scope -> query yielding (key, value) pairs from the base tables.
+SOURCES = {
+    "doctors": "SELECT 0, COUNT(*) FROM doctors",
+    "patients": "SELECT 0, COUNT(*) FROM patients",
+    "department_doctors": "SELECT department_id, COUNT(*) FROM doctors WHERE department_id IS NOT NULL GROUP BY department_id",
+    "doctor_patients": "SELECT doctor_id, COUNT(DISTINCT patient_id) FROM appointments GROUP BY doctor_id",
+}
+# From migration 15 on, doctor_patients also counts the (doctor, patient) pairs archive.py recorded.
+ARCHIVED_DOCTOR_PATIENTS = """SELECT doctor_id, COUNT(*) FROM (
+  SELECT doctor_id, patient_id FROM appointments UNION SELECT doctor_id, patient_id FROM archived_visits
+) GROUP BY doctor_id"""
+
+
+def sources(db):
+    if db.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='archived_visits'").fetchone():
+        return dict(SOURCES, doctor_patients=ARCHIVED_DOCTOR_PATIENTS)
+    return SOURCES
+
+
+def expected(db):
+    return {(scope, key): value for scope, sql in sources(db).items() for key, value in db.execute(sql)}
+
+
+def stored(db):
+    placeholders = ",".join("?" * len(SOURCES))
+    rows = db.execute(f"SELECT scope, key, value FROM counters WHERE scope IN ({placeholders})", tuple(SOURCES))
+    return {(scope, key): value for scope, key, value in rows}
+
+
+def reconcile(db, fix=False):
+    """Compares stored counters with a fresh recount.
+
+    Returns ``(scope, key, stored, expected)`` for every counter that differs;
+    a missing row counts as zero. With ``fix`` the stored rows are overwritten
+    (the caller commits).
+    """
+    want, have = expected(db), stored(db)
+    drift = []
+    for scope, key in sorted(set(want) | set(have), key=lambda k: (k[0], k[1])):
+        if want.get((scope, key), 0) != have.get((scope, key), 0):
+            drift.append((scope, key, have.get((scope, key)), want.get((scope, key), 0)))
+    if fix:
+        db.executemany("INSERT OR REPLACE INTO counters (scope, key, value) VALUES (?,?,?)",
+                       [(scope, key, value) for scope, key, _, value in drift])
+    return drift
+
+
+def rebuild(db):
+    """Replaces every counter with a fresh recount (the caller commits)."""
+    db.executemany("DELETE FROM counters WHERE scope=?", [(scope,) for scope in SOURCES])
+    db.executemany("INSERT INTO counters (scope, key, value) VALUES (?,?,?)",
+                   [(scope, key, value) for (scope, key), value in expected(db).items()])
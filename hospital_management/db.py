@@ -0,0 +1,293 @@
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import quote
+
+import queries
+
+
+# Connection-setup profiles. Every profile runs in WAL mode so readers never
+# block on the writer; they differ in how much durability they trade for speed.
+# auto_vacuum comes first: it only takes on a file that has no tables yet and
+# is not in WAL mode, so new databases get it and existing ones are unchanged
+# until compaction.enable_incremental_vacuum.
+PRAGMA_PROFILES = {
+    "durable": {
+        "auto_vacuum": "INCREMENTAL", "busy_timeout": 10000, "journal_mode": "WAL", "synchronous": "FULL",
+        "cache_size": -8000, "mmap_size": 0, "temp_store": "DEFAULT",
+        "wal_autocheckpoint": 1000,
+    },
+    "balanced": {
+        "auto_vacuum": "INCREMENTAL", "busy_timeout": 5000, "journal_mode": "WAL", "synchronous": "NORMAL",
+        "cache_size": -32000, "mmap_size": 128 * 1024 * 1024, "temp_store": "MEMORY",
+        "wal_autocheckpoint": 1000,
+    },
+    "throughput": {
+        "auto_vacuum": "INCREMENTAL", "busy_timeout": 2000, "journal_mode": "WAL", "synchronous": "OFF",
+        "cache_size": -128000, "mmap_size": 512 * 1024 * 1024, "temp_store": "MEMORY",
+        "wal_autocheckpoint": 10000,
+    },
+}
+
+
+# Only the writer applies these. auto_vacuum and journal_mode are written into
+# the database file, which a mode=ro connection cannot change. wal_autocheckpoint
+# is per-connection, but checkpoints only run after a commit that wrote to the
+# WAL, so on a read-only connection it would never take effect.
+WRITER_PRAGMAS = ("auto_vacuum", "journal_mode", "wal_autocheckpoint")
+
+
+def apply_profile(conn, name, readonly=False):
+    """Applies a named PRAGMA profile to a freshly opened connection."""
+    try:
+        pragmas = PRAGMA_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"unknown DB profile {name!r}; expected one of {sorted(PRAGMA_PROFILES)}")
+    for key, value in pragmas.items():
+        if not (readonly and key in WRITER_PRAGMAS):
+            conn.execute(f"PRAGMA {key}={value}")
+    if readonly:
+        conn.execute("PRAGMA query_only=1")
+
+
+class QueryRecord:
+    """One traced statement: its text, parameter shape, time spent and rows returned."""
+
+    __slots__ = ("sql", "params", "duration", "rows")
+
+    def __init__(self, sql, params):
+        self.sql = sql
+        self.params = params
+        self.duration = 0.0
+        self.rows = 0
+
+    @property
+    def name(self):
+        return queries.NAMES.get(self.sql, "<ad hoc>")
+
+    @property
+    def shape(self):
+        """Parameter types or names only; values may hold patient data and are never logged."""
+        if isinstance(self.params, dict):
+            return "{" + ", ".join(f":{k}" for k in sorted(self.params)) + "}"
+        return "(" + ", ".join(type(p).__name__ for p in self.params) + ")"
+
+
+class TracingCursor(sqlite3.Cursor):
+    """Cursor that adds fetch time and row counts to its QueryRecord."""
+
+    record = None
+
+    def _fetch(self, fetch, *args):
+        started = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            self.record.duration += time.perf_counter() - started
+
+    def fetchone(self):
+        row = self._fetch(super().fetchone)
+        if row is not None:
+            self.record.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._fetch(super().fetchmany, self.arraysize if size is None else size)
+        self.record.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(super().fetchall)
+        self.record.rows += len(rows)
+        return rows
+
+    def __next__(self):
+        row = self._fetch(super().__next__)
+        self.record.rows += 1
+        return row
+
+
+class Connection(sqlite3.Connection):
+    """sqlite3 connection that feeds queries.STATS on every execute.
+
+    While ``query_log`` is a list, every statement is also traced into it as a
+    QueryRecord.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._prepared = set()
+        self.query_log = None
+
+    def _record(self, sql):
+        hit = sql in self._prepared
+        if not hit and sql in queries.NAMES:
+            self._prepared.add(sql)
+        queries.STATS.record(sql, hit)
+
+    def _traced(self, method, sql, parameters, record_params):
+        record = QueryRecord(sql, record_params)
+        self.query_log.append(record)
+        cur = self.cursor(TracingCursor)
+        cur.record = record
+        started = time.perf_counter()
+        try:
+            return method(cur, sql, parameters)
+        finally:
+            record.duration += time.perf_counter() - started
+
+    def execute(self, sql, parameters=()):
+        self._record(sql)
+        if self.query_log is None:
+            return super().execute(sql, parameters)
+        return self._traced(sqlite3.Cursor.execute, sql, parameters, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._record(sql)
+        if self.query_log is None:
+            return super().executemany(sql, seq_of_parameters)
+        return self._traced(sqlite3.Cursor.executemany, sql, seq_of_parameters, ())
+
+    def explain(self, record):
+        """EXPLAIN QUERY PLAN lines for a traced statement, or [] if it has none."""
+        try:
+            return [row[3] for row in super().execute("EXPLAIN QUERY PLAN " + record.sql, record.params)]
+        except sqlite3.Error:
+            return []
+
+
+class RowStream:
+    """Iterates a cursor lazily for a streamed template.
+
+    ``count`` and ``last`` fill in as rows go by, so the template can build
+    the next-page link after the loop without the rows ever being held in a list.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.count = 0
+        self.last = None
+
+    def __iter__(self):
+        for row in self._cursor:
+            self.count += 1
+            self.last = row
+            yield row
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection frees up within the checkout timeout."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of configured SQLite connections.
+
+    Connections are opened lazily up to ``size`` (the first ``warm`` are opened
+    eagerly), configured once with the ``profile`` PRAGMAs, and reused across
+    requests. After a fork the pool notices the new pid and starts over, so each
+    worker process owns its own connections.
+
+    A ``readonly`` pool opens ``mode=ro`` URI connections with ``query_only``
+    set; under WAL these never contend with the writer.
+    """
+
+    def __init__(self, path, size=8, warm=2, timeout=10.0, profile="balanced", readonly=False):
+        if profile not in PRAGMA_PROFILES:
+            raise ValueError(f"unknown DB profile {profile!r}; expected one of {sorted(PRAGMA_PROFILES)}")
+        self.path = path
+        self.profile = profile
+        self.readonly = readonly
+        self.size = size
+        self.warm = min(warm, size)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # Signalled whenever a connection goes back to _idle or a broken one
+        # frees its slot, so waiters can take the former or open the latter.
+        self._freed = threading.Condition(self._lock)
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []
+        self._opened = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        for _ in range(self.warm):
+            self._idle.append(self._open())
+
+    def _open(self):
+        target = f"file:{quote(os.path.abspath(self.path))}?mode=ro" if self.readonly else self.path
+        conn = sqlite3.connect(target, uri=self.readonly, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False,
+                               factory=Connection, cached_statements=queries.CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        apply_profile(conn, self.profile, readonly=self.readonly)
+        self._opened += 1
+        return conn
+
+    def acquire(self):
+        """Checks a connection out, opening a new one if the pool is not full, else waiting up to ``timeout``."""
+        with self._freed:
+            if self._pid != os.getpid():
+                self._reset()
+            started = deadline = None
+            while not self._idle and self._opened >= self.size:
+                if started is None:
+                    started = time.perf_counter()
+                    deadline = started + self.timeout
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise PoolTimeout(f"no connection available after {self.timeout}s")
+                self._freed.wait(remaining)
+            conn = self._idle.pop() if self._idle else self._open()
+            self._in_use += 1
+            self._checkouts += 1
+            if started is not None:
+                waited = time.perf_counter() - started
+                self._waits += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            return conn
+
+    def release(self, conn):
+        """Returns a connection, discarding any transaction the request left open."""
+        if self._pid != os.getpid():
+            conn.close()
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            conn = None
+        with self._freed:
+            self._in_use -= 1
+            if conn is None:
+                self._opened -= 1
+            else:
+                self._idle.append(conn)
+            self._freed.notify()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "profile": self.profile,
+                "readonly": self.readonly,
+                "size": self.size,
+                "open": self._opened,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_ms_total": round(self._wait_total * 1000, 3),
+                "wait_ms_max": round(self._wait_max * 1000, 3),
+            }
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
+            self._opened = self._in_use
@@ -0,0 +1,528 @@
+"""Ordered schema migrations, tracked by PRAGMA user_version.
+
+Each migration runs in its own transaction and is recorded in
+``schema_migrations`` with a checksum of its source, so an edited migration is
+caught instead of silently diverging. A migration may declare a batched
+backfill, which runs after its DDL in short transactions of its own.
+``PRAGMA user_version`` only moves once the backfill is done, so when the
+schema is current, startup costs just one pragma read.
+"""
+import hashlib
+import inspect
+import logging
+from collections import namedtuple
+from datetime import datetime
+
+from werkzeug.security import generate_password_hash
+
+import counters
+
+Migration = namedtuple("Migration", "version name fn backfill")
+Backfill = namedtuple("Backfill", "table assignments where batch")
+
+MIGRATIONS = []
+
+logger = logging.getLogger("hospital.migrations")
+
+
+class MigrationError(Exception):
+    """Raised when the recorded migrations no longer match the code."""
+
+
+def migration(version, backfill=None):
+    """Registers the decorated function as schema migration ``version``."""
+    def register(fn):
+        expected = len(MIGRATIONS) + 1
+        if version != expected:
+            raise MigrationError(f"migration {fn.__name__} is numbered {version}, expected {expected}")
+        MIGRATIONS.append(Migration(version, fn.__name__, fn, backfill))
+        return fn
+    return register
+
+
+def checksum(m):
+    source = inspect.getsource(m.fn) + repr(tuple(m.backfill or ()))
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def add_column(db, table, column, decl):
+    """ALTER TABLE ADD COLUMN, skipped when the column already exists."""
+    if column not in {row[1] for row in db.execute(f"PRAGMA table_info({table})")}:
+        db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def run_backfill(db, bf):
+    """Applies ``bf`` over rowid ranges, committing after each batch."""
+    lo, hi = db.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {bf.table}").fetchone()
+    if lo is None:
+        return
+    for start in range(lo, hi + 1, bf.batch):
+        db.execute(f"UPDATE {bf.table} SET {bf.assignments} WHERE rowid >= ? AND rowid < ? AND ({bf.where})",
+                   (start, start + bf.batch))
+        db.commit()
+
+
+def migrate(db):
+    """Applies pending migrations and returns how many ran."""
+    current = db.execute("PRAGMA user_version").fetchone()[0]
+    if current >= len(MIGRATIONS):
+        return 0
+
+    db.execute("""CREATE TABLE IF NOT EXISTS schema_migrations (
+      version INTEGER PRIMARY KEY, name TEXT NOT NULL, checksum TEXT NOT NULL,
+      applied_at TEXT NOT NULL, completed_at TEXT
+    )""")
+    verify(db)
+    for m in MIGRATIONS[current:]:
+        # BEGIN IMMEDIATE serializes concurrent migrators; whoever loses the race
+        # finds the row already recorded and only (re)runs the idempotent backfill.
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if not db.execute("SELECT 1 FROM schema_migrations WHERE version=?", (m.version,)).fetchone():
+                m.fn(db)
+                db.execute("INSERT INTO schema_migrations (version, name, checksum, applied_at) VALUES (?,?,?,?)",
+                           (m.version, m.name, checksum(m), datetime.now().isoformat()))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        if m.backfill:
+            run_backfill(db, m.backfill)
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("UPDATE schema_migrations SET completed_at=COALESCE(completed_at, ?) WHERE version=?",
+                   (datetime.now().isoformat(), m.version))
+        db.execute(f"PRAGMA user_version={m.version}")
+        db.commit()
+    return len(MIGRATIONS) - current
+
+
+def verify(db):
+    """Raises MigrationError if an applied migration's source has since changed."""
+    recorded = dict(db.execute("SELECT version, checksum FROM schema_migrations"))
+    for m in MIGRATIONS:
+        if m.version in recorded and recorded[m.version] != checksum(m):
+            raise MigrationError(f"migration {m.version} ({m.name}) changed after it was applied")
+
+
+def status(db):
+    """Yields ``(version, name, state)`` for every known migration."""
+    has_table = db.execute("SELECT 1 FROM sqlite_master WHERE name='schema_migrations'").fetchone()
+    recorded = {}
+    if has_table:
+        recorded = {r[0]: r for r in db.execute("SELECT version, checksum, completed_at FROM schema_migrations")}
+    for m in MIGRATIONS:
+        row = recorded.get(m.version)
+        if row is None:
+            state = "pending"
+        elif row[1] != checksum(m):
+            state = "CHANGED"
+        else:
+            state = "applied" if row[2] else "backfilling"
+        yield m.version, m.name, state
+
+
+# --- Migrations ---
+@migration(1)
+def base_tables(db):
+    db.execute("""CREATE TABLE IF NOT EXISTS users (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      username TEXT UNIQUE NOT NULL, password_hash TEXT NOT NULL,
+      role TEXT NOT NULL CHECK(role IN ('admin','doctor','patient')),
+      full_name TEXT, email TEXT, phone TEXT, is_active INTEGER DEFAULT 1
+    );""")
+
+    db.execute("""CREATE TABLE IF NOT EXISTS departments (
+      id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL, description TEXT
+    );""")
+
+    db.execute("""CREATE TABLE IF NOT EXISTS doctors (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER UNIQUE NOT NULL,
+        department_id INTEGER, experience TEXT, bio TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id), FOREIGN KEY(department_id) REFERENCES departments(id)
+    );""")
+
+    db.execute("""CREATE TABLE IF NOT EXISTS patients (
+      id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER UNIQUE NOT NULL,
+      address TEXT, blood_group TEXT, emergency_contact TEXT,
+      FOREIGN KEY(user_id) REFERENCES users(id)
+    );""")
+
+    db.execute("""CREATE TABLE IF NOT EXISTS appointments (
+      id INTEGER PRIMARY KEY AUTOINCREMENT, patient_id INTEGER NOT NULL, doctor_id INTEGER NOT NULL,
+      date TEXT NOT NULL, time TEXT NOT NULL, end_time TEXT,
+      status TEXT NOT NULL DEFAULT 'Booked', created_at TEXT NOT NULL,
+      FOREIGN KEY(patient_id) REFERENCES patients(id), FOREIGN KEY(doctor_id) REFERENCES doctors(id)
+    );""")
+
+    db.execute("""CREATE TABLE IF NOT EXISTS treatments (
+      id INTEGER PRIMARY KEY AUTOINCREMENT, appointment_id INTEGER UNIQUE NOT NULL,
+      diagnosis TEXT, prescription TEXT, notes TEXT,
+      FOREIGN KEY(appointment_id) REFERENCES appointments(id)
+    );""")
+
+    db.execute("""CREATE TABLE IF NOT EXISTS doctor_availability (
+      id INTEGER PRIMARY KEY AUTOINCREMENT, doctor_id INTEGER NOT NULL,
+      date TEXT NOT NULL, start_time TEXT NOT NULL, end_time TEXT NOT NULL,
+      is_booked INTEGER DEFAULT 0, booked_by INTEGER, booked_at TEXT,
+      FOREIGN KEY(doctor_id) REFERENCES doctors(id)
+    );""")
+
+
+@migration(2)
+def patient_age(db):
+    add_column(db, "patients", "age", "INTEGER")
+
+
+@migration(3, backfill=Backfill(
+    "appointments",
+    "start_ts=CAST(strftime('%s', date||' '||time) AS INTEGER), "
+    "end_ts=CAST(strftime('%s', date||' '||COALESCE(end_time, time)) AS INTEGER)",
+    "start_ts IS NULL", 5000))
+def appointment_timestamps(db):
+    """Epoch start/end columns so time-window queries can use an index."""
+    add_column(db, "appointments", "start_ts", "INTEGER")
+    add_column(db, "appointments", "end_ts", "INTEGER")
+
+
+@migration(4)
+def hot_path_indexes(db):
+    """Indexes for the predicates used by the dashboards, slot listings, cancel and reschedule.
+
+    Partial indexes only cover the rows the hot paths filter on (booked
+    appointments, open slots), so they stay small as history grows.
+    """
+    # doctor_dashboard: today/active counts and the active appointment list
+    db.execute("CREATE INDEX IF NOT EXISTS idx_appt_doctor_status_ts ON appointments(doctor_id, status, start_ts)")
+    # doctor_dashboard: distinct patient count and patient list
+    db.execute("CREATE INDEX IF NOT EXISTS idx_appt_doctor_patient ON appointments(doctor_id, patient_id)")
+    # patient_dashboard, admin_view_patient, doctor_view_patient_history
+    db.execute("CREATE INDEX IF NOT EXISTS idx_appt_patient_ts ON appointments(patient_id, start_ts)")
+    # admin_dashboard / admin_appointments: upcoming and chronological listings
+    db.execute("CREATE INDEX IF NOT EXISTS idx_appt_booked_ts ON appointments(start_ts) WHERE status='Booked'")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_appt_start_ts ON appointments(start_ts)")
+    # shared_cancel_appointment / patient_request_reschedule slot lookups, doctor_availability summary
+    db.execute("CREATE INDEX IF NOT EXISTS idx_avail_slot ON doctor_availability(doctor_id, date, start_time)")
+    # patient_view_doctor_availability / patient_request_reschedule open slot listings
+    db.execute("CREATE INDEX IF NOT EXISTS idx_avail_open ON doctor_availability(doctor_id, date, start_time) WHERE is_booked=0")
+    # admin_departments doctor counts
+    db.execute("CREATE INDEX IF NOT EXISTS idx_doctors_department ON doctors(department_id)")
+
+
+@migration(5)
+def default_admin(db):
+    if not db.execute("SELECT id FROM users WHERE role='admin'").fetchone():
+        pw = generate_password_hash("admin123")
+        db.execute("INSERT INTO users (username,password_hash,role,full_name,email) VALUES (?,?,?,?,?)",
+                   ("admin", pw, "admin", "Default Admin", "admin@example.com"))
+        print("Created default admin.")
+
+
+_APPOINTMENT_NAMES = """
+    patient_name=(SELECT u.full_name FROM patients p JOIN users u ON p.user_id=u.id WHERE p.id={a}.patient_id),
+    patient_phone=(SELECT u.phone FROM patients p JOIN users u ON p.user_id=u.id WHERE p.id={a}.patient_id),
+    doctor_name=(SELECT u.full_name FROM doctors d JOIN users u ON d.user_id=u.id WHERE d.id={a}.doctor_id),
+    department=(SELECT dep.name FROM doctors d JOIN departments dep ON d.department_id=dep.id WHERE d.id={a}.doctor_id)"""
+
+
+@migration(6, backfill=Backfill("appointments", _APPOINTMENT_NAMES.format(a="appointments"), "doctor_name IS NULL", 5000))
+def appointment_read_model(db):
+    """Patient/doctor names, phone and department copied onto each appointment.
+
+    Listing pages read them straight off appointments instead of joining
+    patients, doctors, users and departments; the triggers below keep the
+    copies in step with every write to those tables.
+    """
+    for column in ("patient_name", "patient_phone", "doctor_name", "department"):
+        add_column(db, "appointments", column, "TEXT")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_appt_names_insert AFTER INSERT ON appointments
+    BEGIN
+      UPDATE appointments SET {_APPOINTMENT_NAMES.format(a="NEW")} WHERE id=NEW.id;
+    END""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_appt_names_relink AFTER UPDATE OF patient_id, doctor_id ON appointments
+    BEGIN
+      UPDATE appointments SET {_APPOINTMENT_NAMES.format(a="NEW")} WHERE id=NEW.id;
+    END""")
+    db.execute("""CREATE TRIGGER IF NOT EXISTS trg_user_names AFTER UPDATE OF full_name, phone ON users
+    WHEN OLD.full_name IS NOT NEW.full_name OR OLD.phone IS NOT NEW.phone
+    BEGIN
+      UPDATE appointments SET patient_name=NEW.full_name, patient_phone=NEW.phone
+      WHERE patient_id=(SELECT id FROM patients WHERE user_id=NEW.id);
+      UPDATE appointments SET doctor_name=NEW.full_name
+      WHERE doctor_id=(SELECT id FROM doctors WHERE user_id=NEW.id);
+    END""")
+    db.execute("""CREATE TRIGGER IF NOT EXISTS trg_doctor_department AFTER UPDATE OF department_id ON doctors
+    BEGIN
+      UPDATE appointments SET department=(SELECT name FROM departments WHERE id=NEW.department_id)
+      WHERE doctor_id=NEW.id;
+    END""")
+    db.execute("""CREATE TRIGGER IF NOT EXISTS trg_department_name AFTER UPDATE OF name ON departments
+    WHEN OLD.name IS NOT NEW.name
+    BEGIN
+      UPDATE appointments SET department=NEW.name
+      WHERE doctor_id IN (SELECT id FROM doctors WHERE department_id=NEW.id);
+    END""")
+
+
+def _bump(scope, key, delta, when=None):
+    """Trigger statement adding ``delta`` to counter ``(scope, key)``, optionally only ``when``."""
+    return (f"INSERT INTO counters (scope, key, value) SELECT '{scope}', {key}, {delta} WHERE {when or 1} "
+            f"ON CONFLICT(scope, key) DO UPDATE SET value=value+excluded.value;")
+
+
+_OTHER_VISIT = "EXISTS (SELECT 1 FROM appointments WHERE doctor_id={r}.doctor_id AND patient_id={r}.patient_id AND id!={r}.id)"
+
+
+@migration(7)
+def counters_table(db):
+    """Exact counts for admin_dashboard, admin_departments and doctor_dashboard.
+
+    Scopes: ``doctors`` and ``patients`` (key 0), ``department_doctors`` keyed
+    by department id and ``doctor_patients`` (distinct patients seen) keyed by
+    doctor id. The distinct-patient count only moves when the first or last
+    appointment between a doctor and patient comes or goes.
+    """
+    db.execute("""CREATE TABLE IF NOT EXISTS counters (
+      scope TEXT NOT NULL, key INTEGER NOT NULL, value INTEGER NOT NULL DEFAULT 0,
+      PRIMARY KEY (scope, key)
+    ) WITHOUT ROWID""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_count_doctor_insert AFTER INSERT ON doctors
+    BEGIN
+      {_bump("doctors", 0, 1)}
+      {_bump("department_doctors", "NEW.department_id", 1, "NEW.department_id IS NOT NULL")}
+    END""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_count_doctor_delete AFTER DELETE ON doctors
+    BEGIN
+      {_bump("doctors", 0, -1)}
+      {_bump("department_doctors", "OLD.department_id", -1, "OLD.department_id IS NOT NULL")}
+    END""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_count_doctor_department AFTER UPDATE OF department_id ON doctors
+    WHEN OLD.department_id IS NOT NEW.department_id
+    BEGIN
+      {_bump("department_doctors", "OLD.department_id", -1, "OLD.department_id IS NOT NULL")}
+      {_bump("department_doctors", "NEW.department_id", 1, "NEW.department_id IS NOT NULL")}
+    END""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_count_patient_insert AFTER INSERT ON patients
+    BEGIN
+      {_bump("patients", 0, 1)}
+    END""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_count_patient_delete AFTER DELETE ON patients
+    BEGIN
+      {_bump("patients", 0, -1)}
+    END""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_count_appt_insert AFTER INSERT ON appointments
+    BEGIN
+      {_bump("doctor_patients", "NEW.doctor_id", 1, "NOT " + _OTHER_VISIT.format(r="NEW"))}
+    END""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_count_appt_delete AFTER DELETE ON appointments
+    BEGIN
+      {_bump("doctor_patients", "OLD.doctor_id", -1, "NOT " + _OTHER_VISIT.format(r="OLD"))}
+    END""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_count_appt_relink AFTER UPDATE OF doctor_id, patient_id ON appointments
+    WHEN OLD.doctor_id IS NOT NEW.doctor_id OR OLD.patient_id IS NOT NEW.patient_id
+    BEGIN
+      {_bump("doctor_patients", "OLD.doctor_id", -1, "NOT " + _OTHER_VISIT.format(r="OLD"))}
+      {_bump("doctor_patients", "NEW.doctor_id", 1, "NOT " + _OTHER_VISIT.format(r="NEW"))}
+    END""")
+    counters.rebuild(db)
+
+
+@migration(8)
+def directory_version(db):
+    """A ``directory_version`` counter bumped by every write the doctor directory cache depends on."""
+    bump = _bump("directory_version", 0, 1)
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_directory_doctor_insert AFTER INSERT ON doctors
+    BEGIN {bump} END""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_directory_doctor_update AFTER UPDATE ON doctors
+    BEGIN {bump} END""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_directory_doctor_delete AFTER DELETE ON doctors
+    BEGIN {bump} END""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_directory_user_update AFTER UPDATE OF username, full_name, email, phone, is_active ON users
+    WHEN NEW.role='doctor' OR OLD.role='doctor'
+    BEGIN {bump} END""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_directory_department_update AFTER UPDATE ON departments
+    BEGIN {bump} END""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_directory_department_delete AFTER DELETE ON departments
+    BEGIN {bump} END""")
+    db.execute("INSERT OR IGNORE INTO counters (scope, key, value) VALUES ('directory_version', 0, 1)")
+
+
+_DOCTOR_SEARCH_ROW = """SELECT d.id, u.full_name, u.username, u.email, dep.name, d.bio
+      FROM doctors d JOIN users u ON d.user_id=u.id LEFT JOIN departments dep ON d.department_id=dep.id"""
+
+
+@migration(9)
+def doctor_search(db):
+    """FTS5 index over doctor name, username, email, department and bio (rowid = doctors.id).
+
+    Two- and three-character prefix indexes keep search-as-you-type cheap, and
+    the stored rank weights name and department matches above email and bio.
+    """
+    add_column(db, "doctors", "bio", "TEXT")
+    db.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS doctor_search USING fts5(
+      full_name, username, email, department, bio, prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+    )""")
+    db.execute("INSERT INTO doctor_search (doctor_search, rank) VALUES ('rank', 'bm25(10.0, 4.0, 2.0, 6.0, 1.0)')")
+    cols = "rowid, full_name, username, email, department, bio"
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_doctor_search_insert AFTER INSERT ON doctors
+    BEGIN
+      INSERT INTO doctor_search ({cols}) {_DOCTOR_SEARCH_ROW} WHERE d.id=NEW.id;
+    END""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_doctor_search_update AFTER UPDATE OF user_id, department_id, bio ON doctors
+    BEGIN
+      DELETE FROM doctor_search WHERE rowid=OLD.id;
+      INSERT INTO doctor_search ({cols}) {_DOCTOR_SEARCH_ROW} WHERE d.id=NEW.id;
+    END""")
+    db.execute("""CREATE TRIGGER IF NOT EXISTS trg_doctor_search_delete AFTER DELETE ON doctors
+    BEGIN
+      DELETE FROM doctor_search WHERE rowid=OLD.id;
+    END""")
+    db.execute("""CREATE TRIGGER IF NOT EXISTS trg_doctor_search_user AFTER UPDATE OF username, full_name, email ON users
+    WHEN NEW.role='doctor'
+    BEGIN
+      UPDATE doctor_search SET full_name=NEW.full_name, username=NEW.username, email=NEW.email
+      WHERE rowid=(SELECT id FROM doctors WHERE user_id=NEW.id);
+    END""")
+    db.execute("""CREATE TRIGGER IF NOT EXISTS trg_doctor_search_department AFTER UPDATE OF name ON departments
+    BEGIN
+      UPDATE doctor_search SET department=NEW.name
+      WHERE rowid IN (SELECT id FROM doctors WHERE department_id=NEW.id);
+    END""")
+    db.execute("DELETE FROM doctor_search")
+    db.execute(f"INSERT INTO doctor_search ({cols}) {_DOCTOR_SEARCH_ROW}")
+
+
+@migration(10)
+def patient_search(db):
+    """Trigram FTS5 index over patient name, username, email and phone (rowid = patients.id).
+
+    Trigrams answer the admin patient search's substring matches from the
+    index. Queries shorter than three characters fall back to prefix matches
+    on the NOCASE name and username indexes.
+    """
+    db.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS patient_search USING fts5(
+      full_name, username, email, phone, tokenize='trigram'
+    )""")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_users_full_name_nocase ON users(full_name COLLATE NOCASE)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_users_username_nocase ON users(username COLLATE NOCASE)")
+    db.execute("""CREATE TRIGGER IF NOT EXISTS trg_patient_search_insert AFTER INSERT ON patients
+    BEGIN
+      INSERT INTO patient_search (rowid, full_name, username, email, phone)
+      SELECT NEW.id, full_name, username, email, phone FROM users WHERE id=NEW.user_id;
+    END""")
+    db.execute("""CREATE TRIGGER IF NOT EXISTS trg_patient_search_delete AFTER DELETE ON patients
+    BEGIN
+      DELETE FROM patient_search WHERE rowid=OLD.id;
+    END""")
+    db.execute("""CREATE TRIGGER IF NOT EXISTS trg_patient_search_user AFTER UPDATE OF username, full_name, email, phone ON users
+    WHEN NEW.role='patient'
+    BEGIN
+      UPDATE patient_search SET full_name=NEW.full_name, username=NEW.username, email=NEW.email, phone=NEW.phone
+      WHERE rowid=(SELECT id FROM patients WHERE user_id=NEW.id);
+    END""")
+    db.execute("DELETE FROM patient_search")
+    db.execute("""INSERT INTO patient_search (rowid, full_name, username, email, phone)
+      SELECT p.id, u.full_name, u.username, u.email, u.phone FROM patients p JOIN users u ON p.user_id=u.id""")
+
+
+@migration(11)
+def appointment_filter_indexes(db):
+    """(filter column, start_ts) indexes so every admin_appointments filter pages in index order."""
+    db.execute("CREATE INDEX IF NOT EXISTS idx_appt_doctor_ts ON appointments(doctor_id, start_ts)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_appt_department_ts ON appointments(department, start_ts)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_appt_status_ts ON appointments(status, start_ts)")
+
+
+@migration(12)
+def one_booking_per_slot(db):
+    """At most one Booked appointment per doctor and start time.
+
+    Replaces the legacy unique (doctor_id, date, time) index some databases
+    carry, which also counted cancelled appointments and so blocked rebooking
+    a released slot. Existing double bookings are resolved first: the one
+    created earliest keeps the slot, the others are Cancelled and logged.
+    """
+    losers = db.execute("""SELECT a.id, a.doctor_id, a.patient_id, a.date, a.time FROM appointments a
+      WHERE a.status='Booked' AND EXISTS (SELECT 1 FROM appointments k WHERE k.status='Booked'
+        AND k.doctor_id=a.doctor_id AND k.start_ts=a.start_ts AND (k.created_at, k.id) < (a.created_at, a.id))""").fetchall()
+    for appointment_id, doctor_id, patient_id, day, time in losers:
+        logger.warning("cancelled appointment %d of patient %d: doctor %d was double-booked at %s %s",
+                       appointment_id, patient_id, doctor_id, day, time)
+        db.execute("UPDATE appointments SET status='Cancelled' WHERE id=?", (appointment_id,))
+        # The slot row belongs to the booking that kept it.
+        db.execute("""UPDATE doctor_availability SET booked_by=(SELECT patient_id FROM appointments
+            WHERE status='Booked' AND doctor_id=?1 AND date=?2 AND time=?3)
+          WHERE doctor_id=?1 AND date=?2 AND start_time=?3 AND is_booked=1""", (doctor_id, day, time))
+    db.execute("DROP INDEX IF EXISTS idx_appointments_unique")
+    db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_appt_booked_slot ON appointments(doctor_id, start_ts) WHERE status='Booked'")
+
+
+@migration(13)
+def unique_slot_key(db):
+    """UNIQUE (doctor_id, date, start_time) on doctor_availability, after removing duplicates.
+
+    Of each duplicate group the booked row survives (else the oldest), so
+    INSERT OR IGNORE in slot generation finally has a key to ignore on. Drops
+    the legacy four-column unique index and the plain idx_avail_slot, which
+    the new index supersedes.
+    """
+    db.execute("""DELETE FROM doctor_availability WHERE id NOT IN (
+      SELECT COALESCE(MIN(CASE WHEN is_booked=1 THEN id END), MIN(id))
+      FROM doctor_availability GROUP BY doctor_id, date, start_time
+    )""")
+    db.execute("DROP INDEX IF EXISTS idx_doctor_availability_unique")
+    db.execute("DROP INDEX IF EXISTS idx_avail_slot")
+    db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_avail_unique_slot ON doctor_availability(doctor_id, date, start_time)")
+
+
+@migration(14, backfill=Backfill(
+    "doctor_availability", "start_ts=CAST(strftime('%s', date||' '||start_time) AS INTEGER)", "start_ts IS NULL", 5000))
+def availability_timestamps(db):
+    """Epoch start_ts on doctor_availability so open-slot windows are one index range.
+
+    Slot generation writes start_ts itself; the trigger fills it for any other
+    writer. idx_avail_open_ts replaces idx_avail_open, whose (date, start_time)
+    ranges the earliest-slot merge no longer uses.
+    """
+    add_column(db, "doctor_availability", "start_ts", "INTEGER")
+    db.execute("""CREATE TRIGGER IF NOT EXISTS trg_avail_start_ts AFTER INSERT ON doctor_availability
+    WHEN NEW.start_ts IS NULL
+    BEGIN
+      UPDATE doctor_availability SET start_ts=CAST(strftime('%s', NEW.date||' '||NEW.start_time) AS INTEGER) WHERE id=NEW.id;
+    END""")
+    db.execute("DROP INDEX IF EXISTS idx_avail_open")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_avail_open_ts ON doctor_availability(doctor_id, start_ts) WHERE is_booked=0")
+
+
+# A visit outside the hot table: archive.py records each archived (doctor, patient) pair here.
+_ARCHIVED_VISIT = "EXISTS (SELECT 1 FROM archived_visits WHERE doctor_id={r}.doctor_id AND patient_id={r}.patient_id)"
+
+
+@migration(15)
+def archived_visits(db):
+    """``archived_visits`` keeps doctor_patients counting patients across both tiers.
+
+    archive.py records every (doctor, patient) pair it moves before deleting
+    the hot rows, and the appointment counter triggers treat a recorded pair
+    as another visit, so archiving never lowers the count and a new hot visit
+    after an archived one never raises it.
+    """
+    db.execute("""CREATE TABLE IF NOT EXISTS archived_visits (
+      doctor_id INTEGER NOT NULL, patient_id INTEGER NOT NULL, PRIMARY KEY (doctor_id, patient_id)
+    ) WITHOUT ROWID""")
+    seen = {r: f"NOT ({_OTHER_VISIT.format(r=r)} OR {_ARCHIVED_VISIT.format(r=r)})" for r in ("NEW", "OLD")}
+    for name in ("trg_count_appt_insert", "trg_count_appt_delete", "trg_count_appt_relink"):
+        db.execute(f"DROP TRIGGER IF EXISTS {name}")
+    db.execute(f"""CREATE TRIGGER trg_count_appt_insert AFTER INSERT ON appointments
+    BEGIN
+      {_bump("doctor_patients", "NEW.doctor_id", 1, seen["NEW"])}
+    END""")
+    db.execute(f"""CREATE TRIGGER trg_count_appt_delete AFTER DELETE ON appointments
+    BEGIN
+      {_bump("doctor_patients", "OLD.doctor_id", -1, seen["OLD"])}
+    END""")
+    db.execute(f"""CREATE TRIGGER trg_count_appt_relink AFTER UPDATE OF doctor_id, patient_id ON appointments
+    WHEN OLD.doctor_id IS NOT NEW.doctor_id OR OLD.patient_id IS NOT NEW.patient_id
+    BEGIN
+      {_bump("doctor_patients", "OLD.doctor_id", -1, seen["OLD"])}
+      {_bump("doctor_patients", "NEW.doctor_id", 1, seen["NEW"])}
+    END""")
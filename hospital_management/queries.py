@@ -0,0 +1,241 @@
+"""Every SQL statement the app runs, as named constants.
+
+Keeping the text of each statement fixed lets sqlite3's per-connection
+statement cache reuse the prepared statement instead of re-parsing it, and
+STATS shows which statements dominate.
+"""
+import itertools
+import threading
+
+# --- Auth ---
+USER_BY_USERNAME = "SELECT * FROM users WHERE username=? AND is_active=1"
+USER_BY_ID = "SELECT * FROM users WHERE id=?"
+INSERT_USER = "INSERT INTO users (username,password_hash,role,full_name,email,phone) VALUES (?,?,?,?,?,?)"
+UPDATE_USER_CONTACT = "UPDATE users SET full_name=?, email=?, phone=? WHERE id=?"
+USER_IS_ACTIVE = "SELECT is_active FROM users WHERE id=?"
+SET_USER_ACTIVE = "UPDATE users SET is_active=? WHERE id=?"
+
+# --- Admin dashboard ---
+COUNT_DOCTORS = "SELECT COALESCE((SELECT value FROM counters WHERE scope='doctors' AND key=0), 0) c"
+COUNT_PATIENTS = "SELECT COALESCE((SELECT value FROM counters WHERE scope='patients' AND key=0), 0) c"
+# Time-relative, so not a counter; an index range count over idx_appt_booked_ts.
+COUNT_UPCOMING = "SELECT COUNT(*) c FROM appointments WHERE start_ts >= ? AND status='Booked'"
+ADMIN_UPCOMING = """
+  SELECT a.id, a.patient_name, a.doctor_name, a.date, a.time, a.status FROM appointments a
+  WHERE a.start_ts >= ? AND a.status='Booked' ORDER BY a.start_ts LIMIT 10
+"""
+ADMIN_PAST = """
+  SELECT a.id, a.patient_name, a.doctor_name, a.date, a.time, a.status FROM appointments a
+  WHERE a.start_ts < ? OR a.status != 'Booked' ORDER BY a.start_ts DESC LIMIT 10
+"""
+
+# --- Doctors ---
+_DOCTOR_LIST = """
+    SELECT d.id, u.full_name, u.username, u.email, u.phone, dep.name department, d.experience
+    FROM doctors d
+    JOIN users u ON d.user_id=u.id
+    LEFT JOIN departments dep ON d.department_id=dep.id
+"""
+INSERT_DOCTOR = "INSERT INTO doctors (user_id, department_id, experience) VALUES (?,?,?)"
+DOCTOR_DETAIL = "SELECT d.id, u.username, u.full_name, u.email, u.phone, u.is_active, d.experience, dep.name as department FROM doctors d JOIN users u ON d.user_id=u.id LEFT JOIN departments dep ON d.department_id=dep.id WHERE d.id=?"
+DOCTOR_RECENT_APPOINTMENTS = "SELECT a.id, a.date, a.time, a.status, a.patient_name FROM appointments a WHERE a.doctor_id=? ORDER BY a.date DESC LIMIT 20"
+DOCTOR_FOR_EDIT = "SELECT d.*, u.full_name, u.email, u.phone FROM doctors d JOIN users u ON d.user_id=u.id WHERE d.id=?"
+UPDATE_DOCTOR_EXPERIENCE = "UPDATE doctors SET experience=? WHERE id=?"
+DOCTOR_USER_ID = "SELECT user_id FROM doctors WHERE id=?"
+DOCTOR_BY_USER = "SELECT * FROM doctors WHERE user_id=?"
+DOCTOR_ID_BY_USER = "SELECT id FROM doctors WHERE user_id=?"
+DOCTOR_CARD = "SELECT d.id, u.full_name, dep.name as department FROM doctors d JOIN users u ON d.user_id=u.id LEFT JOIN departments dep ON d.department_id=dep.id WHERE d.id=?"
+# Loaded whole into cache.DoctorDirectory, which serves the doctor list, directory, dashboard strip and profiles.
+DOCTOR_DIRECTORY = _DOCTOR_LIST + " ORDER BY u.full_name"
+DIRECTORY_VERSION = "SELECT COALESCE((SELECT value FROM counters WHERE scope='directory_version' AND key=0), 0) c"
+# Ranked by the bm25 weights stored with the doctor_search table; rowid is doctors.id.
+DOCTOR_SEARCH = "SELECT rowid id FROM doctor_search WHERE doctor_search MATCH ? ORDER BY rank LIMIT ? OFFSET ?"
+
+# --- Doctor dashboard ---
+DOCTOR_PATIENT_COUNT = "SELECT COALESCE((SELECT value FROM counters WHERE scope='doctor_patients' AND key=?), 0) c"
+DOCTOR_TODAY_COUNT = "SELECT COUNT(*) c FROM appointments WHERE doctor_id=? AND status='Booked' AND start_ts >= ? AND start_ts < ?"
+DOCTOR_ACTIVE_COUNT = "SELECT COUNT(*) c FROM appointments WHERE doctor_id=? AND status='Booked' AND start_ts >= ?"
+DOCTOR_ACTIVE_APPOINTMENTS = """
+    SELECT a.id, a.date, a.time, a.patient_name, a.patient_id FROM appointments a
+    WHERE a.doctor_id=? AND a.status='Booked' ORDER BY a.start_ts
+"""
+# Hot-tier patients with the names copied onto their appointments, then patients only seen in the archive.
+DOCTOR_PATIENTS = """
+  SELECT DISTINCT a.patient_id, a.patient_name as full_name, a.patient_phone as phone FROM appointments a WHERE a.doctor_id=?1
+  UNION ALL
+  SELECT v.patient_id, u.full_name, u.phone FROM archived_visits v JOIN patients p ON p.id=v.patient_id JOIN users u ON u.id=p.user_id
+  WHERE v.doctor_id=?1 AND NOT EXISTS (SELECT 1 FROM appointments a WHERE a.doctor_id=?1 AND a.patient_id=v.patient_id)
+"""
+
+# --- Departments ---
+DEPARTMENT_ID_BY_NAME = "SELECT id FROM departments WHERE name=?"
+DEPARTMENT_BY_ID = "SELECT * FROM departments WHERE id=?"
+ALL_DEPARTMENTS = "SELECT * FROM departments"
+DEPARTMENT_NAMES = "SELECT name FROM departments ORDER BY name"
+DEPARTMENT_ACTIVE_DOCTORS = "SELECT d.id FROM departments dep JOIN doctors d ON d.department_id=dep.id JOIN users u ON d.user_id=u.id WHERE dep.name=? AND u.is_active=1"
+DEPARTMENT_LIST_WITH_COUNTS = "SELECT dep.id, dep.name, dep.description, COALESCE(c.value, 0) as doctor_count FROM departments dep LEFT JOIN counters c ON c.scope='department_doctors' AND c.key=dep.id ORDER BY dep.name"
+INSERT_DEPARTMENT = "INSERT INTO departments (name, description) VALUES (?, ?)"
+UPDATE_DEPARTMENT = "UPDATE departments SET name=?, description=? WHERE id=?"
+
+# --- Patients ---
+INSERT_PATIENT = "INSERT INTO patients (user_id) VALUES (?)"
+PATIENT_BY_USER = "SELECT * FROM patients WHERE user_id=?"
+PATIENT_ID_BY_USER = "SELECT id FROM patients WHERE user_id=?"
+UPDATE_PATIENT_PROFILE = "UPDATE patients SET address=?, blood_group=?, emergency_contact=?, age=? WHERE user_id=?"
+_PATIENT_LIST = "SELECT p.id, u.id as user_id, u.full_name, u.username, u.email, u.phone, u.is_active FROM patients p JOIN users u ON p.user_id=u.id"
+# Keyset pages on p.id: params are (after_id, limit), preceded by the search term where there is one.
+PATIENT_LIST = _PATIENT_LIST + " WHERE p.id > ? ORDER BY p.id LIMIT ?"
+PATIENT_LIST_SEARCH = _PATIENT_LIST + """
+  WHERE p.id IN (SELECT rowid FROM patient_search WHERE patient_search MATCH ? AND rowid > ? ORDER BY rowid LIMIT ?)
+  ORDER BY p.id"""
+# Short queries page through a name range in idx_users_full_name_nocase order instead, keyed on
+# (full_name, users.id): params are (low, high, after_name, after_user_id, limit).
+PATIENT_LIST_PREFIX = _PATIENT_LIST + """
+  WHERE u.role='patient' AND u.full_name >= ?1 COLLATE NOCASE AND u.full_name < ?2 COLLATE NOCASE
+    AND (u.full_name COLLATE NOCASE, u.id) > (?3, ?4) ORDER BY u.full_name COLLATE NOCASE, u.id LIMIT ?5"""
+PATIENT_SEARCH_COUNT = "SELECT COUNT(*) c FROM (SELECT 1 FROM patient_search WHERE patient_search MATCH ? LIMIT ?)"
+PATIENT_PREFIX_COUNT = """SELECT COUNT(*) c FROM (SELECT 1 FROM users
+  WHERE role='patient' AND full_name >= ?1 COLLATE NOCASE AND full_name < ?2 COLLATE NOCASE LIMIT ?3)"""
+PATIENT_DETAIL = "SELECT p.id, u.full_name, u.username, u.email, u.phone, p.address, p.blood_group, p.emergency_contact, p.age FROM patients p JOIN users u ON p.user_id=u.id WHERE p.id=?"
+PATIENT_SUMMARY = "SELECT p.id as patient_id, u.full_name, u.email, u.phone, p.address, p.blood_group, p.age FROM patients p JOIN users u ON p.user_id=u.id WHERE p.id=?"
+PATIENT_APPOINTMENTS = "SELECT a.id, a.date, a.time, a.status, a.doctor_id, a.doctor_name, t.diagnosis, t.prescription FROM appointments a LEFT JOIN treatments t ON t.appointment_id=a.id WHERE a.patient_id=? ORDER BY a.date DESC"
+PATIENT_COMPLETED_RECORDS = "SELECT a.id as appt_id, a.date, a.time, a.status, a.doctor_id, t.diagnosis, t.prescription, t.notes FROM appointments a LEFT JOIN treatments t ON t.appointment_id=a.id WHERE a.patient_id=? AND a.status='Completed' ORDER BY a.date DESC"
+# ?history=1 variants over archive.py's appointment_history view, which also takes in the archived rows.
+PATIENT_APPOINTMENTS_HISTORY = "SELECT id, date, time, status, doctor_id, doctor_name, diagnosis, prescription FROM appointment_history WHERE patient_id=? ORDER BY date DESC"
+PATIENT_COMPLETED_RECORDS_HISTORY = "SELECT id as appt_id, date, time, status, doctor_id, diagnosis, prescription, notes FROM appointment_history WHERE patient_id=? AND status='Completed' ORDER BY date DESC"
+PATIENT_UPCOMING = "SELECT a.id, a.date, a.time, a.status, a.doctor_name, a.doctor_id FROM appointments a WHERE a.patient_id=? AND a.start_ts >= ? AND a.status='Booked' ORDER BY a.start_ts"
+PATIENT_PAST = "SELECT a.id, a.date, a.time, a.status, a.doctor_name, t.diagnosis, t.prescription, t.notes FROM appointments a LEFT JOIN treatments t ON t.appointment_id=a.id WHERE a.patient_id=? AND (a.start_ts < ? OR a.status!='Booked') ORDER BY a.start_ts DESC"
+
+# --- Appointments ---
+_APPOINTMENT_LIST = "SELECT a.id, a.start_ts, a.date, a.time, a.status, a.patient_name, a.patient_phone, a.doctor_name, a.department FROM appointments a"
+# admin_appointments filters -> predicate; each is served by an index ending in start_ts.
+APPOINTMENT_FILTERS = {
+    "doctor_id": "a.doctor_id = :doctor_id",
+    "department": "a.department = :department",
+    "status": "a.status = :status",
+    "start": "a.start_ts >= :start",
+    "end": "a.start_ts < :end",
+    "past": "(a.start_ts < :past OR a.status != 'Booked')",
+}
+
+
+def _appointment_page(filters, descending):
+    """Keyset page over (start_ts, id) after the :after_ts/:after_id cursor."""
+    op, order = ("<", "DESC") if descending else (">", "ASC")
+    where = [APPOINTMENT_FILTERS[f] for f in filters] + [f"(a.start_ts, a.id) {op} (:after_ts, :after_id)"]
+    return f"{_APPOINTMENT_LIST} WHERE {' AND '.join(where)} ORDER BY a.start_ts {order}, a.id {order} LIMIT :limit"
+
+
+# One statement per filter combination and direction, generated up front so the
+# text for a given request is always the same and stays in the statement cache.
+APPOINTMENT_PAGES = {
+    (filters, descending): _appointment_page(filters, descending)
+    for n in range(len(APPOINTMENT_FILTERS) + 1)
+    for filters in itertools.combinations(APPOINTMENT_FILTERS, n)
+    for descending in (True, False)
+}
+APPOINTMENT_BY_ID = "SELECT * FROM appointments WHERE id=?"
+APPOINTMENT_WITH_PATIENT = "SELECT a.* FROM appointments a WHERE a.id=?"
+INSERT_APPOINTMENT = "INSERT INTO appointments (patient_id, doctor_id, date, time, end_time, status, created_at, start_ts, end_ts) VALUES (?,?,?,?,?,?,?,?,?)"
+RESCHEDULE_APPOINTMENT = "UPDATE appointments SET date=?, time=?, end_time=?, start_ts=?, end_ts=? WHERE id=?"
+COMPLETE_APPOINTMENT = "UPDATE appointments SET status='Completed' WHERE id=?"
+CANCEL_APPOINTMENT = "UPDATE appointments SET status='Cancelled' WHERE id=?"
+
+# --- Treatments ---
+UPSERT_TREATMENT = "INSERT OR REPLACE INTO treatments (appointment_id, diagnosis, prescription, notes) VALUES (?,?,?,?)"
+TREATMENT_BY_APPOINTMENT = "SELECT * FROM treatments WHERE appointment_id=?"
+PAST_TREATMENTS = "SELECT a.date as appt_date, a.time as appt_time, t.* FROM treatments t JOIN appointments a ON t.appointment_id=a.id WHERE a.patient_id=? AND a.id!=? ORDER BY a.date DESC"
+
+# --- Availability ---
+SLOT_BY_ID = "SELECT * FROM doctor_availability WHERE id=?"
+SLOT_WITH_DOCTOR = "SELECT da.*, u.full_name as doctor_name FROM doctor_availability da JOIN doctors d ON da.doctor_id=d.id JOIN users u ON d.user_id=u.id WHERE da.id=?"
+SLOT_SUMMARY = """
+  SELECT date, COUNT(*) total, SUM(is_booked) booked, MIN(start_time) start_time, MAX(end_time) end_time
+  FROM doctor_availability WHERE doctor_id=? AND date >= ? AND date <= ? GROUP BY date
+"""
+# A doctor's open slots with start_ts in [from, to): one idx_avail_open_ts range, however much history there is.
+OPEN_SLOTS_IN_WINDOW = "SELECT * FROM doctor_availability WHERE doctor_id=? AND is_booked=0 AND start_ts >= ? AND start_ts < ? ORDER BY start_ts"
+# A doctor's first open slot at or after a start, then the one after a given slot, both before an end;
+# the earliest-slot merge walks each doctor's calendar one indexed row at a time.
+FIRST_OPEN_SLOT = """
+  SELECT id, doctor_id, date, start_time, end_time, start_ts FROM doctor_availability
+  WHERE doctor_id=? AND is_booked=0 AND start_ts >= ? AND start_ts < ? ORDER BY start_ts LIMIT 1
+"""
+NEXT_OPEN_SLOT = """
+  SELECT id, doctor_id, date, start_time, end_time, start_ts FROM doctor_availability
+  WHERE doctor_id=? AND is_booked=0 AND start_ts > ? AND start_ts < ? ORDER BY start_ts LIMIT 1
+"""
+DELETE_OPEN_SLOTS_FOR_DAY = "DELETE FROM doctor_availability WHERE doctor_id=? AND date=? AND is_booked=0"
+INSERT_SLOT = "INSERT OR IGNORE INTO doctor_availability (doctor_id, date, start_time, end_time, start_ts, is_booked) VALUES (?, ?, ?, ?, ?, 0)"
+# Claims an open slot; a rowcount of 0 means another booking got there first.
+CLAIM_SLOT = "UPDATE doctor_availability SET is_booked=1, booked_by=?, booked_at=? WHERE id=? AND is_booked=0"
+RELEASE_SLOT = "UPDATE doctor_availability SET is_booked=0, booked_by=NULL, booked_at=NULL WHERE doctor_id=? AND date=? AND start_time=?"
+
+# --- Compaction (compaction.py) ---
+# Candidates are found by rowid keyset outside any transaction; the delete
+# re-checks the predicate over the same rowid range while holding the lock.
+EXPIRED_SLOT_IDS = "SELECT id FROM doctor_availability WHERE id > ? AND is_booked=0 AND start_ts < ? ORDER BY id LIMIT ?"
+DELETE_EXPIRED_SLOTS = "DELETE FROM doctor_availability WHERE id >= ? AND id <= ? AND is_booked=0 AND start_ts < ?"
+# The lease row holds the epoch second until which one process owns background
+# compaction; a rowcount of 0 means another process still holds it.
+CLAIM_COMPACTION_LEASE = """INSERT INTO counters (scope, key, value) VALUES ('compaction_lease', 0, ?2)
+  ON CONFLICT (scope, key) DO UPDATE SET value=excluded.value WHERE value <= ?1"""
+EXTEND_COMPACTION_LEASE = "UPDATE counters SET value=? WHERE scope='compaction_lease' AND key=0"
+
+# --- Archive (archive.py) ---
+ARCHIVE_APPOINTMENT_COLUMNS = ("id", "patient_id", "doctor_id", "date", "time", "end_time", "status", "created_at",
+                               "start_ts", "end_ts", "patient_name", "patient_phone", "doctor_name", "department")
+ARCHIVE_TREATMENT_COLUMNS = ("id", "appointment_id", "diagnosis", "prescription", "notes")
+_archive_appointments = ", ".join(ARCHIVE_APPOINTMENT_COLUMNS)
+_archive_treatments = ", ".join(ARCHIVE_TREATMENT_COLUMNS)
+_archive_batch = "SELECT value FROM json_each(?)"
+# Candidates are found by (start_ts, id) keyset outside any transaction; each
+# batch then moves exactly those ids, passed as a JSON array, in this order.
+ARCHIVABLE_IDS = """SELECT id, start_ts FROM main.appointments
+  WHERE start_ts < ? AND status IN ('Completed', 'Cancelled') AND (start_ts, id) > (?, ?) ORDER BY start_ts, id LIMIT ?"""
+ARCHIVE_RECORD_VISITS = f"""INSERT OR IGNORE INTO main.archived_visits (doctor_id, patient_id)
+  SELECT DISTINCT doctor_id, patient_id FROM main.appointments WHERE id IN ({_archive_batch})"""
+ARCHIVE_COPY_APPOINTMENTS = f"""INSERT OR REPLACE INTO archive.appointments ({_archive_appointments})
+  SELECT {_archive_appointments} FROM main.appointments WHERE id IN ({_archive_batch})"""
+ARCHIVE_COPY_TREATMENTS = f"""INSERT OR REPLACE INTO archive.treatments ({_archive_treatments})
+  SELECT {_archive_treatments} FROM main.treatments WHERE appointment_id IN ({_archive_batch})"""
+ARCHIVE_DELETE_TREATMENTS = f"DELETE FROM main.treatments WHERE appointment_id IN ({_archive_batch})"
+ARCHIVE_DELETE_APPOINTMENTS = f"DELETE FROM main.appointments WHERE id IN ({_archive_batch})"
+
+
+# sql text -> constant name, for every statement above.
+NAMES = {sql: name for name, sql in list(globals().items())
+         if name.isupper() and not name.startswith("_") and isinstance(sql, str)}
+NAMES.update({sql: f"APPOINTMENT_PAGE[{'+'.join(filters) or 'all'}{'' if descending else ' asc'}]"
+              for (filters, descending), sql in APPOINTMENT_PAGES.items()})
+
+# Room for every registered statement plus the ad-hoc ones (migrations, PRAGMAs).
+CACHE_SIZE = len(NAMES) + 32
+
+
+class StatementStats:
+    """Thread-safe execute/cache-hit counters per registered statement.
+
+    A "hit" is an execution of a statement the connection has already
+    prepared, which the statement cache (sized by CACHE_SIZE) then reuses.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, sql, hit):
+        name = NAMES.get(sql, "<ad hoc>")
+        with self._lock:
+            counts = self._counts.setdefault(name, [0, 0])
+            counts[0] += 1
+            counts[1] += hit
+
+    def snapshot(self):
+        """Returns one ``{"name", "executes", "hits"}`` dict per statement, busiest first."""
+        with self._lock:
+            items = sorted(self._counts.items(), key=lambda kv: -kv[1][0])
+            return [{"name": name, "executes": e, "hits": h} for name, (e, h) in items]
+
+
+STATS = StatementStats()
@@ -0,0 +1,60 @@
+"""Timestamp encoding for the *_ts columns and a query-plan check for the hot queries in app.py."""
+import calendar
+from datetime import datetime
+
+import queries
+
+
+def to_ts(day, hm):
+    """Epoch seconds for a wall-clock date and HH:MM, as stored in the *_ts columns.
+
+    Wall-clock times are encoded as if they were UTC, which matches SQLite's
+    strftime('%s', date||' '||time) used by the backfill.
+    """
+    return calendar.timegm(datetime.strptime(f"{day} {hm}", "%Y-%m-%d %H:%M").timetuple())
+
+
+def now_ts():
+    """The current local wall-clock time in the same encoding as to_ts()."""
+    return calendar.timegm(datetime.now().timetuple())
+
+
+# queries.py statement name -> sample params, for the route predicates the indexes guard.
+HOT_QUERIES = {
+    "ADMIN_UPCOMING": (0,),
+    "ADMIN_PAST": (0,),
+    "DOCTOR_PATIENT_COUNT": (1,),
+    "DOCTOR_TODAY_COUNT": (1, 0, 86400),
+    "DOCTOR_ACTIVE_COUNT": (1, 0),
+    "DOCTOR_ACTIVE_APPOINTMENTS": (1,),
+    "DOCTOR_PATIENTS": (1,),
+    "PATIENT_UPCOMING": (1, 0),
+    "PATIENT_PAST": (1, 0),
+    "OPEN_SLOTS_IN_WINDOW": (1, 0, 1209600),
+    "SLOT_SUMMARY": (1, "2025-01-01", "2025-03-31"),
+    "RELEASE_SLOT": (1, "2025-01-01", "09:00"),
+    "FIRST_OPEN_SLOT": (1, 0, 1209600),
+    "NEXT_OPEN_SLOT": (1, 0, 1209600),
+    "DEPARTMENT_ACTIVE_DOCTORS": ("Cardiology",),
+    "PATIENT_LIST_PREFIX": ("a", "a\U0010ffff", "a", 0, 50),
+}
+
+# Sample named params covering every generated APPOINTMENT_PAGES variant.
+APPOINTMENT_PAGE_PARAMS = {"doctor_id": 1, "department": "Cardiology", "status": "Booked", "start": 0, "end": 86400,
+                           "past": 0, "after_ts": 0, "after_id": 0, "limit": 50}
+
+
+def check_query_plans(db):
+    """Runs EXPLAIN QUERY PLAN over HOT_QUERIES.
+
+    Returns ``(name, plan_lines, ok)`` tuples; ``ok`` is False when the plan
+    falls back to a full scan of a table instead of an index search.
+    """
+    statements = [(name, getattr(queries, name), params) for name, params in HOT_QUERIES.items()]
+    statements += [(queries.NAMES[sql], sql, APPOINTMENT_PAGE_PARAMS) for sql in queries.APPOINTMENT_PAGES.values()]
+    results = []
+    for name, sql, params in statements:
+        plan = [row[3] for row in db.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        ok = not any(line.startswith("SCAN ") and " USING " not in line and line != "SCAN CONSTANT ROW" for line in plan)
+        results.append((name, plan, ok))
+    return results
@@ -0,0 +1,72 @@
+"""Full-text search over doctors and patients.
+
+The ``doctor_search`` FTS5 table (migration 9) mirrors each doctor's name,
+username, email, department and bio under ``rowid = doctors.id`` and is kept in
+step by triggers. Matches come back bm25-ranked, one page at a time.
+
+``patient_search`` (migration 10) is a trigram index over patient name,
+username, email and phone, paged by patient id so any page costs the same.
+Queries too short for trigrams page through a name range of the NOCASE name
+index instead.
+"""
+import re
+from collections import namedtuple
+
+import queries as Q
+
+_WORD = re.compile(r"\w+")
+
+
+def match_expression(q):
+    """Turns free text into an FTS5 query in which every word must match as a prefix.
+
+    Words are quoted, so FTS5 operators and punctuation typed by users are
+    taken literally.
+    """
+    return " ".join(f'"{word}"*' for word in _WORD.findall(q))
+
+
+def search_doctor_ids(db, q, page=1, per_page=20):
+    """Returns ``(doctor_ids, has_next)`` for 1-based ``page`` of the ranked matches."""
+    expr = match_expression(q)
+    if not expr:
+        return [], False
+    rows = db.execute(Q.DOCTOR_SEARCH, (expr, per_page + 1, (page - 1) * per_page)).fetchall()
+    ids = [row["id"] for row in rows]
+    return ids[:per_page], len(ids) > per_page
+
+
+# Patient searches stop counting here; the page shows "COUNT_CAP+" beyond it.
+COUNT_CAP = 1000
+
+# Sorts after every character under NOCASE, closing a prefix range.
+_PREFIX_END = "\U0010ffff"
+
+PatientPage = namedtuple("PatientPage", "rows total capped by_name")
+
+
+def patient_page(db, q, after=0, per_page=50, after_name=None):
+    """Returns the PatientPage of patients after the cursor matching ``q``; ``rows`` is an unread cursor.
+
+    Three or more characters are matched as a substring of name, username,
+    email or phone through the trigram index, paged by patient id > ``after``.
+    Shorter queries match a name prefix and page in name order (``by_name``),
+    the cursor being the last row's ``after_name`` and user id ``after``, so a
+    page reads only its own rows however common the prefix. With no query,
+    ``total`` is the patients counter.
+    """
+    if len(q) >= 3:
+        term = '"' + q.replace('"', '""') + '"'
+        total = db.execute(Q.PATIENT_SEARCH_COUNT, (term, COUNT_CAP + 1)).fetchone()["c"]
+        rows = db.execute(Q.PATIENT_LIST_SEARCH, (term, after, per_page))
+    elif q:
+        high = q + _PREFIX_END
+        total = db.execute(Q.PATIENT_PREFIX_COUNT, (q, high, COUNT_CAP + 1)).fetchone()["c"]
+        # The cursor name matched the prefix, so it is the tighter lower bound.
+        low = after_name if after_name is not None else q
+        rows = db.execute(Q.PATIENT_LIST_PREFIX, (low, high, low, after, per_page))
+        return PatientPage(rows, min(total, COUNT_CAP), total > COUNT_CAP, True)
+    else:
+        total = db.execute(Q.COUNT_PATIENTS).fetchone()["c"]
+        rows = db.execute(Q.PATIENT_LIST, (after, per_page))
+    return PatientPage(rows, min(total, COUNT_CAP) if q else total, bool(q) and total > COUNT_CAP, False)
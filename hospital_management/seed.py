@@ -0,0 +1,277 @@
+"""Seeded synthetic data for large hospital.db fixtures.
+
+Builds a new database with the app's schema and fills every table at the
+requested scale; the same --seed and --today give the same rows:
+
+    python seed.py fixture.db --departments 50 --doctors 5000 --patients 1000000 --appointments 20000000
+
+Appointments follow a seasonal curve (winter peaks, quiet weekends, future
+days filling up less the further out they are), busy and quiet doctors, a
+handful of frequent patients, and bookings clustered in runs of adjacent
+morning or afternoon slots. Past appointments are mostly Completed (most
+with a treatment), some Cancelled and a few left Booked as no-shows; future
+ones are Booked or Cancelled, and the doctors' open slot grid for the next
+--slot-days days marks the booked ones.
+
+Rows go in with executemany in large transactions, with the triggers and
+secondary indexes of the loaded tables dropped for the load and recreated
+after it; the counters, FTS tables and directory version the triggers would
+have maintained are then rebuilt in one pass each.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, timedelta
+
+import counters
+from app import app, init_db, get_db
+from db import apply_profile
+from migrations import _DOCTOR_SEARCH_ROW
+from schema import to_ts
+from werkzeug.security import generate_password_hash
+
+TABLES = ("users", "departments", "doctors", "patients", "appointments", "treatments", "doctor_availability")
+
+SPECIALTIES = [
+    "Cardiology", "Neurology", "Dermatology", "Dentistry", "Psychiatry", "Oncology", "Pediatrics", "Orthopedics",
+    "Gastroenterology", "Endocrinology", "Nephrology", "Pulmonology", "Rheumatology", "Urology", "Ophthalmology",
+    "ENT", "Gynecology", "Obstetrics", "Hematology", "Infectious Diseases", "Geriatrics", "Radiology", "Anesthesiology",
+    "General Surgery", "Plastic Surgery", "Vascular Surgery", "Neurosurgery", "Cardiothoracic Surgery", "Allergy",
+    "Immunology", "Sports Medicine", "Physical Medicine", "Family Medicine", "Internal Medicine", "Emergency Medicine",
+    "Pain Management", "Sleep Medicine", "Nuclear Medicine", "Pathology", "Neonatology", "Palliative Care",
+    "Hepatology", "Audiology", "Podiatry", "Nutrition", "Occupational Health", "Tropical Medicine", "Genetics",
+    "Adolescent Medicine", "Critical Care",
+]
+FIRST_NAMES = ["Arima", "Naman", "Vina", "Mehak", "Prachi", "Varun", "Shasvat", "Priya", "Parth", "Aadhya", "Rohan",
+               "Kavya", "Ishaan", "Ananya", "Vivek", "Sneha", "Arjun", "Diya", "Kabir", "Meera", "Aditya", "Riya",
+               "Karan", "Tara", "Nikhil", "Pooja", "Siddharth", "Neha", "Yash", "Aisha"]
+LAST_NAMES = ["Jain", "Yadav", "Mehta", "Awasthi", "Desai", "Singh", "Sharma", "Soni", "Kapoor", "Iyer", "Reddy", "Das",
+              "Shah", "Gupta", "Nair", "Patel", "Rao", "Joshi", "Bose", "Kulkarni", "Chopra", "Menon", "Verma", "Pillai"]
+BLOOD_GROUPS = (["O+"] * 37 + ["A+"] * 27 + ["B+"] * 22 + ["AB+"] * 6 + ["O-"] * 4 + ["A-"] * 2 + ["B-"] + ["AB-"])
+TREATMENTS = [("Migraine", "Ibuprofen", "Reduce screen time"), ("Hypertension", "Amlodipine", "Low-salt diet"),
+              ("Seasonal flu", "Oseltamivir", "Rest and fluids"), ("Type 2 diabetes", "Metformin", "Review HbA1c in 3 months"),
+              ("Dermatitis", "Hydrocortisone cream", "Avoid irritants"), ("Back pain", "Physiotherapy", "Core exercises"),
+              ("Anxiety", "CBT referral", "Follow up in 4 weeks"), ("Asthma", "Salbutamol inhaler", "Check inhaler technique"),
+              ("Dental caries", "Filling", "Floss daily"), ("Sprained ankle", "RICE protocol", "Review in 2 weeks")]
+
+# Multipliers on the daily appointment rate: winter peaks by month, quiet weekends by weekday.
+MONTH_LOAD = [1.25, 1.2, 1.1, 1.0, 0.9, 0.85, 0.8, 0.85, 0.95, 1.05, 1.15, 1.3]
+WEEKDAY_LOAD = [1.15, 1.1, 1.05, 1.05, 1.0, 0.6, 0.25]
+
+SLOT_MINUTES = 15
+DAY_START = 9 * 60
+SLOTS_PER_DAY = 32  # 09:00-17:00
+SLOT_TIMES = [f"{(DAY_START + i * SLOT_MINUTES) // 60:02d}:{(DAY_START + i * SLOT_MINUTES) % 60:02d}"
+              for i in range(SLOTS_PER_DAY + 1)]
+MORNING, AFTERNOON = range(0, 12), range(20, 32)
+
+
+def bulk_load(db):
+    """Drops the loaded tables' triggers and secondary indexes; returns their SQL for ``restore``."""
+    placeholders = ",".join("?" * len(TABLES))
+    saved = db.execute(f"""SELECT type, name, sql FROM sqlite_master WHERE type IN ('trigger', 'index')
+      AND sql IS NOT NULL AND tbl_name IN ({placeholders})""", TABLES).fetchall()
+    for kind, name, _ in saved:
+        db.execute(f"DROP {kind.upper()} {name}")
+    return saved
+
+
+def restore(db, saved):
+    """Recreates the indexes and triggers, then rebuilds what the triggers would have kept up to date."""
+    for kind in ("index", "trigger"):
+        for k, _, sql in saved:
+            if k == kind:
+                db.execute(sql)
+    counters.rebuild(db)
+    db.execute("UPDATE counters SET value=value+1 WHERE scope='directory_version' AND key=0")
+    db.execute("DELETE FROM doctor_search")
+    db.execute(f"INSERT INTO doctor_search (rowid, full_name, username, email, department, bio) {_DOCTOR_SEARCH_ROW}")
+    db.execute("DELETE FROM patient_search")
+    db.execute("""INSERT INTO patient_search (rowid, full_name, username, email, phone)
+      SELECT p.id, u.full_name, u.username, u.email, u.phone FROM patients p JOIN users u ON p.user_id=u.id""")
+
+
+class Loader:
+    """Row buffers per statement, written with executemany and committed together every ``batch`` rows.
+
+    ``rows(sql)`` hands out the buffer list itself so the generator loops can
+    append to it directly; they call ``check`` between units of work.
+    """
+
+    def __init__(self, db, batch):
+        self.db = db
+        self.batch = batch
+        self.buffers = {}
+        self.total = 0
+
+    def rows(self, sql):
+        return self.buffers.setdefault(sql, [])
+
+    def check(self):
+        if sum(map(len, self.buffers.values())) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        for sql, rows in self.buffers.items():
+            self.db.executemany(sql, rows)
+            self.total += len(rows)
+            rows.clear()
+        self.db.commit()
+
+
+def generate(db, args):
+    rng = random.Random(args.seed)
+    today = date.fromisoformat(args.today)
+    load = Loader(db, args.batch)
+    password = generate_password_hash("password")
+    user_id = db.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0]
+
+    departments = [SPECIALTIES[i % len(SPECIALTIES)] + (f" {i // len(SPECIALTIES) + 1}" if i >= len(SPECIALTIES) else "")
+                   for i in range(args.departments)]
+    load.rows("INSERT INTO departments (id, name, description) VALUES (?,?,?)").extend(
+        (i, name, f"{name} department") for i, name in enumerate(departments, 1))
+    # A few large departments and a long tail of small ones.
+    department_weights = [1 / (i + 1) ** 0.8 for i in range(args.departments)]
+
+    users = load.rows("INSERT INTO users (id, username, password_hash, role, full_name, email, phone, is_active) VALUES (?,?,?,?,?,?,?,?)")
+    doctors = load.rows("INSERT INTO doctors (id, user_id, department_id, experience, bio) VALUES (?,?,?,?,?)")
+    doctor_names, doctor_departments, popularity = [], [], []
+    for i in range(1, args.doctors + 1):
+        user_id += 1
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        dept = rng.choices(range(args.departments), department_weights)[0]
+        name = f"Dr. {first} {last}"
+        users.append((user_id, f"dr.{first.lower()}{i}", password, "doctor", name, f"{first.lower()}.{last.lower()}{i}@hospital.example",
+                      f"+91 9{rng.randrange(10 ** 9):09d}", int(rng.random() > 0.02)))
+        doctors.append((i, user_id, dept + 1, f"{rng.randint(1, 35)} years",
+                        f"{departments[dept]} consultant with an interest in {rng.choice(SPECIALTIES).lower()}."))
+        doctor_names.append(name)
+        doctor_departments.append(departments[dept])
+        popularity.append(rng.lognormvariate(0, 0.6))
+
+    patients = load.rows("INSERT INTO patients (id, user_id, address, blood_group, emergency_contact, age) VALUES (?,?,?,?,?,?)")
+    patient_names, patient_phones = [], []
+    for i in range(1, args.patients + 1):
+        user_id += 1
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        name, phone = f"{first} {last}", f"+91 8{rng.randrange(10 ** 9):09d}"
+        users.append((user_id, f"{first.lower()}{i}", password, "patient", name, f"{first.lower()}.{last.lower()}{i}@mail.example", phone, 1))
+        patients.append((i, user_id, f"{rng.randint(1, 999)} {rng.choice(LAST_NAMES)} Road", rng.choice(BLOOD_GROUPS),
+                         f"+91 7{rng.randrange(10 ** 9):09d}", min(95, max(1, int(rng.gauss(42, 20))))))
+        patient_names.append(name)
+        patient_phones.append(phone)
+        if i % 10000 == 0:
+            load.check()
+
+    days = [today + timedelta(days=d) for d in range(-args.days_back, args.days_ahead)]
+    weights = []
+    for day in days:
+        w = MONTH_LOAD[day.month - 1] * WEEKDAY_LOAD[day.weekday()]
+        if day >= today:
+            w *= 0.9 ** ((day - today).days / 2)
+        weights.append(w)
+    # Scale so the expected total matches --appointments before the per-day slot cap.
+    rate = args.appointments / (sum(popularity) * sum(weights)) if popularity and weights else 0
+    day_iso = [d.isoformat() for d in days]
+    day_ts = [to_ts(iso, "00:00") for iso in day_iso]
+    slot_days = {today + timedelta(days=d) for d in range(args.slot_days)}
+
+    appt_id = 0
+    appointments = load.rows("""INSERT INTO appointments (id, patient_id, doctor_id, date, time, end_time, status, created_at,
+      start_ts, end_ts, patient_name, patient_phone, doctor_name, department) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)""")
+    slots = load.rows("""INSERT INTO doctor_availability (doctor_id, date, start_time, end_time, is_booked, booked_by, booked_at, start_ts)
+      VALUES (?,?,?,?,?,?,?,?)""")
+    treatments = load.rows("INSERT INTO treatments (appointment_id, diagnosis, prescription, notes) VALUES (?,?,?,?)")
+    created_at = [f"{iso}T08:00:00" for iso in day_iso]
+    for doc in range(1, args.doctors + 1):
+        name, dept = doctor_names[doc - 1], doctor_departments[doc - 1]
+        doc_rate = rate * popularity[doc - 1]
+        for d, day in enumerate(days):
+            lam = doc_rate * weights[d]
+            n = min(SLOTS_PER_DAY, int(lam) + (rng.random() < lam - int(lam)))
+            booked = {}
+            if n:
+                # Bookings cluster: a run of adjacent slots from a morning or afternoon start, with occasional gaps.
+                pos = rng.choice(MORNING if rng.random() < 0.6 else AFTERNOON)
+                taken = []
+                while len(taken) < n and pos < SLOTS_PER_DAY:
+                    taken.append(pos)
+                    pos += 1 + (rng.random() < 0.2)
+                if len(taken) < n:
+                    taken = rng.sample(range(SLOTS_PER_DAY), n)
+                future = day >= today
+                for s in taken:
+                    appt_id += 1
+                    patient = 1 + int(args.patients * rng.random() ** 1.6)
+                    r = rng.random()
+                    if future:
+                        status = "Cancelled" if r < 0.07 else "Booked"
+                    else:
+                        status = "Cancelled" if r < 0.12 else "Booked" if r < 0.15 else "Completed"
+                    start = day_ts[d] + (DAY_START + s * SLOT_MINUTES) * 60
+                    # Booked a week ahead on average; the first days of history are clamped to day 0.
+                    created = created_at[max(0, d - int(rng.expovariate(1 / 7)))]
+                    appointments.append((appt_id, patient, doc, day_iso[d], SLOT_TIMES[s], SLOT_TIMES[s + 1], status, created,
+                                         start, start + SLOT_MINUTES * 60, patient_names[patient - 1], patient_phones[patient - 1],
+                                         name, dept))
+                    if status == "Completed" and rng.random() < 0.9:
+                        treatments.append((appt_id,) + TREATMENTS[int(rng.random() * len(TREATMENTS))])
+                    elif status == "Booked":
+                        booked[s] = (patient, created)
+            if day in slot_days:
+                for s in range(SLOTS_PER_DAY):
+                    patient, at = booked.get(s, (None, None))
+                    slots.append((doc, day_iso[d], SLOT_TIMES[s], SLOT_TIMES[s + 1], int(patient is not None), patient, at,
+                                  day_ts[d] + (DAY_START + s * SLOT_MINUTES) * 60))
+        load.check()
+    load.flush()
+    return load.total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="database file to create")
+    parser.add_argument("--force", action="store_true", help="overwrite an existing file")
+    parser.add_argument("--departments", type=int, default=20)
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--appointments", type=int, default=200000)
+    parser.add_argument("--days-back", type=int, default=730, help="days of appointment history")
+    parser.add_argument("--days-ahead", type=int, default=30, help="days of future bookings")
+    parser.add_argument("--slot-days", type=int, default=14, help="days of open slot grid from today")
+    parser.add_argument("--today", default=date.today().isoformat(), help="anchor date; fix it to rerun the same rows")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=200000, help="rows per transaction")
+    args = parser.parse_args()
+
+    if os.path.exists(args.path):
+        if not args.force:
+            raise SystemExit(f"{args.path} exists; pass --force to overwrite it")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.path + suffix):
+                os.remove(args.path + suffix)
+
+    started = time.perf_counter()
+    app.config["DATABASE"] = args.path
+    with app.app_context():
+        init_db()
+        db = get_db()
+        apply_profile(db, "throughput")
+        saved = bulk_load(db)
+        db.commit()
+        rows = generate(db, args)
+        loaded = time.perf_counter() - started
+        restore(db, saved)
+        db.commit()
+        db.execute("ANALYZE")
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        counts = {t: db.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in TABLES}
+    elapsed = time.perf_counter() - started
+    print(", ".join(f"{t} {n}" for t, n in counts.items()))
+    print(f"{rows} rows loaded in {loaded:.1f} s ({rows / loaded:.0f} rows/s), indexes and triggers rebuilt, "
+          f"{elapsed:.1f} s total, {os.path.getsize(args.path) / 2 ** 20:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Archiving a doctor's past appointments leaves the doctor dashboard's patient count and list unchanged."""
+import sqlite3
+
+import pytest
+
+import archive
+import counters
+import queries as Q
+from migrations import migrate
+from schema import to_ts
+
+
+@pytest.fixture
+def db(tmp_path):
+    conn = sqlite3.connect(tmp_path / "hospital.db", isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    migrate(conn)
+    conn.execute("INSERT INTO users (id, username, password_hash, role, full_name) VALUES (100, 'dr', 'x', 'doctor', 'Dr. A')")
+    conn.execute("INSERT INTO doctors (id, user_id) VALUES (1, 100)")
+    for i in range(1, 4):
+        conn.execute("INSERT INTO users (id, username, password_hash, role, full_name, phone) VALUES (?, ?, 'x', 'patient', ?, ?)",
+                     (100 + i, f"p{i}", f"Patient {i}", f"555-{i}"))
+        conn.execute("INSERT INTO patients (id, user_id) VALUES (?, ?)", (i, 100 + i))
+    yield conn
+    conn.close()
+
+
+def book(db, patient_id, day, status):
+    db.execute("""INSERT INTO appointments (patient_id, doctor_id, date, time, end_time, status, created_at, start_ts, end_ts,
+      patient_name, patient_phone) VALUES (?, 1, ?, '09:00', '09:15', ?, ?, ?, ?, ?, ?)""",
+               (patient_id, day, status, day, to_ts(day, "09:00"), to_ts(day, "09:15"), f"Patient {patient_id}", f"555-{patient_id}"))
+
+
+def dashboard(db):
+    count = db.execute(Q.DOCTOR_PATIENT_COUNT, (1,)).fetchone()["c"]
+    return count, sorted(tuple(row) for row in db.execute(Q.DOCTOR_PATIENTS, (1,)))
+
+
+def test_archiving_keeps_doctor_patient_count(db, tmp_path):
+    book(db, 1, "2020-01-06", "Completed")
+    book(db, 2, "2020-02-03", "Cancelled")
+    book(db, 2, "2030-01-07", "Booked")
+    book(db, 3, "2020-03-02", "Completed")
+    before = dashboard(db)
+    assert before[0] == 3
+
+    moved, _ = archive.archive(db, str(tmp_path / "archive.db"), to_ts("2025-01-01", "00:00"))
+
+    assert moved == 3
+    assert dashboard(db) == before
+    assert counters.reconcile(db) == []
+
+
+def test_new_visit_after_archive_is_not_counted_twice(db, tmp_path):
+    book(db, 1, "2020-01-06", "Completed")
+    archive.archive(db, str(tmp_path / "archive.db"), to_ts("2025-01-01", "00:00"))
+
+    book(db, 1, "2030-01-07", "Booked")
+
+    assert dashboard(db)[0] == 1
+    assert len(dashboard(db)[1]) == 1
+    assert counters.reconcile(db) == []
@@ -0,0 +1,26 @@
+"""`flask migrations` lists pending migrations on an unmigrated database instead of applying them first."""
+import sqlite3
+
+from app import app
+from migrations import MIGRATIONS, base_tables
+
+
+def test_lists_pending_migrations_without_applying(tmp_path, monkeypatch):
+    path = tmp_path / "hospital.db"
+    db = sqlite3.connect(path)
+    base_tables(db)  # the tables the baseline init_db created, user_version 0
+    db.commit()
+    db.close()
+    monkeypatch.setitem(app.config, "DATABASE", str(path))
+
+    result = app.test_cli_runner().invoke(args=["migrations"])
+
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert lines[0] == f"user_version 0 of {len(MIGRATIONS)}"
+    assert [line.split()[1] for line in lines[1:]] == ["pending"] * len(MIGRATIONS)
+    db = sqlite3.connect(path)
+    try:
+        assert db.execute("PRAGMA user_version").fetchone()[0] == 0
+    finally:
+        db.close()
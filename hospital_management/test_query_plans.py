@@ -0,0 +1,26 @@
+"""Fails when a hot query in schema.HOT_QUERIES plans a full table scan on a freshly migrated database."""
+import sqlite3
+
+import pytest
+
+from migrations import migrate
+from schema import HOT_QUERIES, check_query_plans
+
+
+@pytest.fixture(scope="module")
+def plans(tmp_path_factory):
+    db = sqlite3.connect(tmp_path_factory.mktemp("plans") / "hospital.db", isolation_level=None)
+    try:
+        migrate(db)
+        yield {name: (plan, ok) for name, plan, ok in check_query_plans(db)}
+    finally:
+        db.close()
+
+
+def test_every_hot_query_is_checked(plans):
+    assert set(HOT_QUERIES) <= set(plans)
+
+
+def test_no_full_scans(plans):
+    scans = {name: plan for name, (plan, ok) in plans.items() if not ok}
+    assert not scans, "\n".join(f"{name}: {' | '.join(plan)}" for name, plan in scans.items())